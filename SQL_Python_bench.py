@@ -0,0 +1,812 @@
+from bisect import bisect_left
+from datetime import datetime, timedelta
+from decimal import Decimal
+from itertools import accumulate
+import argparse
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+import sqlalchemy
+from sqlalchemy import bindparam, func, select
+
+from SQL_Python_sol import SEARCH_FIELDS, AsyncRestaurantDatabase, RestaurantDatabase, _mask_dsn
+
+logger = logging.getLogger(__name__)
+
+
+PRENOMS = [
+    'Amine', 'Sara', 'Youssef', 'Fatima', 'Omar', 'Khadija', 'Mehdi', 'Salma', 'Hamza', 'Imane',
+    'Yassine', 'Nadia', 'Karim', 'Zineb', 'Anas', 'Meryem', 'Reda', 'Houda', 'Ilyas', 'Sanaa',
+]
+NOMS = [
+    'Lahmidi', 'Benali', 'El Khalfi', 'Zahra', 'Alaoui', 'Bennani', 'Tazi', 'Idrissi', 'Chraibi', 'Fassi',
+    'Berrada', 'Amrani', 'Naciri', 'Kettani', 'Sqalli', 'Ouazzani', 'Lahlou', 'Benjelloun', 'Saadi', 'Filali',
+]
+CATEGORIES = ['Entrée', 'Plat principal', 'Dessert', 'Boisson', 'Végétarien']
+PRIX_PAR_CATEGORIE = {1: (25, 60), 2: (60, 180), 3: (20, 60), 4: (8, 30), 5: (45, 120)}
+COMMENTAIRES = {
+    1: ['Très décevant', 'Froid et sans goût', 'Je ne recommande pas'],
+    2: ['Pas terrible', 'Trop salé', 'Portion trop petite'],
+    3: ['Correct sans plus', 'Un peu trop épicé', 'Bon, mais manque de sauce'],
+    4: ['Très bon', 'Bien présenté', 'Frais et copieux'],
+    5: ['Excellent !', 'Meilleur plat du coin !', 'Parfait, je reviendrai'],
+}
+# Relative order volume per month (summer and end-of-year peaks) and per weekday (Monday first)
+SAISONNALITE_MOIS = [0.8, 0.75, 0.85, 0.9, 1.0, 1.1, 1.3, 1.35, 1.0, 0.9, 0.95, 1.25]
+SAISONNALITE_JOUR = [0.7, 0.75, 0.85, 0.9, 1.2, 1.45, 1.3]
+HEURES_SERVICE = [(11, 1), (12, 6), (13, 5), (14, 2), (18, 1), (19, 4), (20, 6), (21, 4), (22, 1)]
+
+
+class WorkloadGenerator:
+    """Seeded synthetic restaurant data for all nine tables, produced lazily row by row.
+    
+    Dish popularity follows a Zipf law, order dates follow monthly, weekly and
+    service-hour seasonality, and order totals are the sum of their lines.
+    Every generator can be replayed independently and yields the same rows.
+    """
+    
+    def __init__(self, n_commandes=10000, n_clients=None, n_plats=None, seed=42,
+                 zipf_s=1.1, avis_ratio=0.2, debut=datetime(2023, 1, 1), jours=3 * 365):
+        self.n_commandes = n_commandes
+        self.n_clients = n_clients or max(50, n_commandes // 8)
+        self.n_plats = n_plats or min(2000, max(20, int(n_commandes ** 0.5)))
+        self.n_fournisseurs = max(4, self.n_plats // 25)
+        self.n_ingredients = max(10, self.n_plats * 2)
+        self.seed = seed
+        self.zipf_s = zipf_s
+        self.avis_ratio = avis_ratio
+        self.debut = debut
+        self.jours = jours
+        
+        rng = random.Random(seed)
+        self.prix = {}
+        self.categorie = {}
+        for plat_id in range(1, self.n_plats + 1):
+            categorie_id = rng.randint(1, len(CATEGORIES))
+            bas, haut = PRIX_PAR_CATEGORIE[categorie_id]
+            self.categorie[plat_id] = categorie_id
+            self.prix[plat_id] = Decimal(str(round(rng.uniform(bas, haut), 2)))
+        self.qualite = {plat_id: rng.uniform(2.5, 4.8) for plat_id in self.prix}
+        
+        # Popularity rank is shuffled so the best sellers are spread over ids and categories
+        ranking = list(self.prix)
+        rng.shuffle(ranking)
+        self._plats_par_rang = ranking
+        self._poids_plats = list(accumulate(1.0 / rang ** zipf_s for rang in range(1, self.n_plats + 1)))
+        
+        poids_jours = []
+        for offset in range(jours):
+            jour = debut + timedelta(days=offset)
+            poids_jours.append(SAISONNALITE_MOIS[jour.month - 1] * SAISONNALITE_JOUR[jour.weekday()])
+        self._poids_jours = list(accumulate(poids_jours))
+        self._heures = [heure for heure, _ in HEURES_SERVICE]
+        self._poids_heures = list(accumulate(poids for _, poids in HEURES_SERVICE))
+    
+    @classmethod
+    def for_lines(cls, n_lines, **kwargs):
+        """Size the workload for roughly n_lines commande_plats rows."""
+        return cls(n_commandes=max(1, int(n_lines / 2.4)), **kwargs)
+    
+    def client_nom(self, client_id):
+        return f"{PRENOMS[client_id % len(PRENOMS)]} {NOMS[(client_id // len(PRENOMS)) % len(NOMS)]} {client_id}"
+    
+    def commande(self, commande_id):
+        rng = random.Random(self.seed * 1_000_003 + commande_id)
+        client_id = rng.randint(1, self.n_clients)
+        jour = bisect_left(self._poids_jours, rng.random() * self._poids_jours[-1])
+        heure = self._heures[bisect_left(self._poids_heures, rng.random() * self._poids_heures[-1])]
+        date_commande = self.debut + timedelta(days=jour, hours=heure, minutes=rng.randint(0, 59))
+        
+        lignes = {}
+        for _ in range(rng.choices((1, 2, 3, 4, 5), weights=(20, 35, 25, 12, 8))[0]):
+            rang = bisect_left(self._poids_plats, rng.random() * self._poids_plats[-1])
+            plat_id = self._plats_par_rang[rang]
+            lignes[plat_id] = lignes.get(plat_id, 0) + rng.choices((1, 2, 3), weights=(80, 15, 5))[0]
+        total = sum(self.prix[plat_id] * quantite for plat_id, quantite in lignes.items())
+        return rng, client_id, date_commande, lignes, total
+    
+    def categories(self):
+        for categorie_id, nom in enumerate(CATEGORIES, 1):
+            yield {'id': categorie_id, 'nom': nom}
+    
+    def fournisseurs(self):
+        for fournisseur_id in range(1, self.n_fournisseurs + 1):
+            yield {'id': fournisseur_id, 'nom': f'Fournisseur {fournisseur_id}',
+                   'contact': f'contact@fournisseur{fournisseur_id}.ma'}
+    
+    def plats(self):
+        for plat_id in range(1, self.n_plats + 1):
+            yield {'id': plat_id, 'nom': f'{CATEGORIES[self.categorie[plat_id] - 1]} {plat_id}',
+                   'prix': self.prix[plat_id], 'description': f'Recette maison numero {plat_id}',
+                   'categorie_id': self.categorie[plat_id]}
+    
+    def clients(self):
+        rng = random.Random(self.seed + 1)
+        for client_id in range(1, self.n_clients + 1):
+            telephone = f'+2126{rng.randint(0, 99999999):08d}' if rng.random() < 0.8 else None
+            yield {'id': client_id, 'nom': self.client_nom(client_id),
+                   'email': f'client{client_id}@example.com', 'telephone': telephone}
+    
+    def ingredients(self):
+        rng = random.Random(self.seed + 2)
+        for ingredient_id in range(1, self.n_ingredients + 1):
+            yield {'id': ingredient_id, 'nom': f'Ingredient {ingredient_id}',
+                   'cout_unitaire': Decimal(str(round(rng.uniform(1, 40), 2))),
+                   'stock': Decimal(str(round(rng.uniform(5, 500), 3))),
+                   'fournisseur_id': rng.randint(1, self.n_fournisseurs)}
+    
+    def commandes(self):
+        for commande_id in range(1, self.n_commandes + 1):
+            _, client_id, date_commande, _, total = self.commande(commande_id)
+            yield {'id': commande_id, 'client_id': client_id, 'date_commande': date_commande, 'total': total}
+    
+    def commande_plats(self):
+        # date_commande only lands in the table when it is partitioned; the loader drops it otherwise
+        for commande_id in range(1, self.n_commandes + 1):
+            _, _, date_commande, lignes, _ = self.commande(commande_id)
+            for plat_id, quantite in lignes.items():
+                yield {'commande_id': commande_id, 'plat_id': plat_id, 'quantite': quantite,
+                       'date_commande': date_commande}
+    
+    def plat_ingredients(self):
+        rng = random.Random(self.seed + 3)
+        for plat_id in range(1, self.n_plats + 1):
+            for ingredient_id in rng.sample(range(1, self.n_ingredients + 1), rng.randint(2, 6)):
+                yield {'plat_id': plat_id, 'ingredient_id': ingredient_id,
+                       'quantite_necessaire': Decimal(str(round(rng.uniform(0.01, 0.4), 3)))}
+    
+    def avis(self):
+        avis_id = 0
+        for commande_id in range(1, self.n_commandes + 1):
+            rng, client_id, date_commande, lignes, _ = self.commande(commande_id)
+            if rng.random() >= self.avis_ratio:
+                continue
+            plat_id = rng.choice(list(lignes))
+            note = min(5, max(1, round(rng.gauss(self.qualite[plat_id], 0.9))))
+            avis_id += 1
+            yield {'id': avis_id, 'client_id': client_id, 'plat_id': plat_id, 'note': note,
+                   'commentaire': rng.choice(COMMENTAIRES[note]) if rng.random() < 0.7 else None,
+                   'date_avis': date_commande + timedelta(hours=rng.randint(1, 48))}
+    
+    def tables(self):
+        return {
+            'categories': self.categories(), 'fournisseurs': self.fournisseurs(), 'plats': self.plats(),
+            'clients': self.clients(), 'ingredients': self.ingredients(), 'commandes': self.commandes(),
+            'commande_plats': self.commande_plats(), 'plat_ingredients': self.plat_ingredients(),
+            'avis': self.avis(),
+        }
+    
+    def describe(self):
+        return {
+            'seed': self.seed, 'n_commandes': self.n_commandes, 'n_clients': self.n_clients,
+            'n_plats': self.n_plats, 'n_ingredients': self.n_ingredients,
+            'n_fournisseurs': self.n_fournisseurs, 'zipf_s': self.zipf_s, 'avis_ratio': self.avis_ratio,
+        }
+
+
+def _time_query(db, query, repeat):
+    best = float('inf')
+    with db.engine.connect() as conn:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            conn.execute(query).fetchall()
+            best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _analyze(db):
+    with db.engine.begin() as conn:
+        conn.exec_driver_sql('ANALYZE')
+
+
+def bench_indexes(connection_string, n_lines, repeat=3):
+    """Time every sample query on the same data without and then with the schema indexes."""
+    db = RestaurantDatabase(connection_string)
+    db.drop_tables()
+    db.create_tables()
+    db.drop_indexes()
+    workload = WorkloadGenerator.for_lines(n_lines)
+    db.bulk_load_all(workload.tables())
+    _analyze(db)
+    
+    queries = db.sample_queries(summaries=False)
+    queries['commandes_client'] = queries['commandes_client'].params(client_nom=workload.client_nom(42))
+    sans_index = {name: _time_query(db, query, repeat) for name, query in queries.items()}
+    
+    db.create_indexes()
+    _analyze(db)
+    avec_index = {name: _time_query(db, query, repeat) for name, query in queries.items()}
+    
+    results = {}
+    print(f"\n{'requete':<22} | {'sans index':>12} | {'avec index':>12} | gain")
+    print("-" * 62)
+    for name in queries:
+        speedup = sans_index[name] / avec_index[name] if avec_index[name] else float('inf')
+        results[name] = {'sans_index_s': sans_index[name], 'avec_index_s': avec_index[name], 'speedup': speedup}
+        print(f"{name:<22} | {sans_index[name] * 1000:>9.2f} ms | {avec_index[name] * 1000:>9.2f} ms | x{speedup:.1f}")
+    return {'n_lines': n_lines, 'queries': results, 'index_usage': db.check_query_indexes()}
+
+
+def _load_dataset(connection_string, workload):
+    db = RestaurantDatabase(connection_string)
+    db.drop_tables()
+    db.create_tables()
+    stats = db.bulk_load_all(workload.tables())
+    _analyze(db)
+    db.engine.dispose()
+    return stats
+
+
+async def _bench_async_reports(connection_string, use_summaries, repeat, client_nom):
+    db = AsyncRestaurantDatabase(connection_string, use_summaries=use_summaries)
+    try:
+        await db.all_reports(client_nom=client_nom)
+        timings = {'sequentiel': [], 'concurrent': []}
+        for _ in range(repeat):
+            for mode, concurrent in (('sequentiel', False), ('concurrent', True)):
+                start = time.perf_counter()
+                await db.all_reports(client_nom=client_nom, concurrent=concurrent)
+                timings[mode].append(time.perf_counter() - start)
+        return timings
+    finally:
+        await db.dispose()
+
+
+def bench_async(connection_string, n_lines, repeat=5, use_summaries=False, load=True):
+    """Compare the six reports awaited one after another with the same reports under asyncio.gather."""
+    workload = WorkloadGenerator.for_lines(n_lines)
+    if load:
+        _load_dataset(connection_string, workload)
+    timings = asyncio.run(_bench_async_reports(connection_string, use_summaries, repeat, workload.client_nom(42)))
+    sequentiel = min(timings['sequentiel'])
+    concurrent = min(timings['concurrent'])
+    print(f"\nSix rapports, sequentiel : {sequentiel * 1000:.2f} ms")
+    print(f"Six rapports, concurrent : {concurrent * 1000:.2f} ms")
+    print(f"Gain                     : x{sequentiel / concurrent:.2f}")
+    return {'n_lines': n_lines, 'use_summaries': use_summaries, 'timings_s': timings,
+            'best_sequentiel_s': sequentiel, 'best_concurrent_s': concurrent}
+
+
+def _latencies(samples):
+    samples = sorted(samples)
+    return {
+        'min_ms': samples[0] * 1000,
+        'median_ms': samples[len(samples) // 2] * 1000,
+        'p95_ms': samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000,
+        'max_ms': samples[-1] * 1000,
+    }
+
+
+def _time_reports(db, workload, repeat):
+    calls = {
+        'plats_par_categorie': db.plats_par_categorie,
+        'commandes_client': lambda: db.commandes_client(workload.client_nom(42)),
+        'top_plats': db.top_plats,
+        'ca_par_categorie': db.ca_par_categorie,
+        'clients_fideles': db.clients_fideles,
+        'notes_moyennes': db.notes_moyennes,
+    }
+    results = {}
+    for name, call in calls.items():
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            call()
+            samples.append(time.perf_counter() - start)
+        results[name] = _latencies(samples)
+    return results
+
+
+def _time_point_lookups(db, workload, n_lookups, seed):
+    rng = random.Random(seed)
+    plat_query = select(db.plats).where(db.plats.c.id == bindparam('plat_id'))
+    commande_query = select(db.commandes).where(db.commandes.c.id == bindparam('commande_id'))
+    results = {}
+    with db.engine.connect() as conn:
+        for name, query, key, upper in (
+            ('plat_par_id', plat_query, 'plat_id', workload.n_plats),
+            ('commande_par_id', commande_query, 'commande_id', workload.n_commandes),
+        ):
+            samples = []
+            for _ in range(n_lookups):
+                start = time.perf_counter()
+                conn.execute(query, {key: rng.randint(1, upper)}).fetchall()
+                samples.append(time.perf_counter() - start)
+            results[name] = _latencies(samples)
+    
+    samples = []
+    for _ in range(n_lookups):
+        start = time.perf_counter()
+        db.commandes_client(workload.client_nom(rng.randint(1, workload.n_clients)))
+        samples.append(time.perf_counter() - start)
+    results['commandes_client'] = _latencies(samples)
+    return results
+
+
+def bench_suite(connection_string, scales, repeat=5, n_lookups=200, seed=42):
+    """Load, report and point-lookup timings at several scale factors (1 = 10k orders)."""
+    runs = []
+    for scale in scales:
+        workload = WorkloadGenerator(n_commandes=int(10000 * scale), seed=seed)
+        print(f"\nEchelle {scale}: {workload.describe()}")
+        
+        start = time.perf_counter()
+        load = _load_dataset(connection_string, workload)
+        load_seconds = time.perf_counter() - start
+        
+        reports = {}
+        for use_summaries in (False, True):
+            db = RestaurantDatabase(connection_string, use_summaries=use_summaries, cache_size=0)
+            reports['syntheses' if use_summaries else 'brut'] = _time_reports(db, workload, repeat)
+            db.engine.dispose()
+        
+        db = RestaurantDatabase(connection_string, cache_size=0)
+        lookups = _time_point_lookups(db, workload, n_lookups, seed)
+        db.engine.dispose()
+        
+        for mode, timings in reports.items():
+            for name, latency in timings.items():
+                print(f"  {mode:<9} {name:<22} | median {latency['median_ms']:>9.2f} ms")
+        for name, latency in lookups.items():
+            print(f"  lookup    {name:<22} | median {latency['median_ms']:>9.2f} ms")
+        
+        runs.append({
+            'scale': scale,
+            'workload': workload.describe(),
+            'load': {'total_s': load_seconds, 'tables': load},
+            'reports': reports,
+            'point_lookups': lookups,
+        })
+    
+    return {
+        'started_at': datetime.now().isoformat(timespec='seconds'),
+        'database': _mask_dsn(connection_string),
+        'python': platform.python_version(),
+        'sqlalchemy': sqlalchemy.__version__,
+        'repeat': repeat,
+        'runs': runs,
+    }
+
+
+ANALYTICS_CALLS = ('top_plats', 'ca_par_categorie', 'clients_fideles', 'notes_moyennes')
+
+
+def bench_analytics(connection_string, scales, repeat=5, n_orders=500, seed=42):
+    """Aggregate report latency from SQL (raw and summaries) against the in-process columnar snapshot."""
+    runs = []
+    for scale in scales:
+        workload = WorkloadGenerator(n_commandes=int(10000 * scale), seed=seed)
+        print(f"\nEchelle {scale}: {workload.describe()}")
+        _load_dataset(connection_string, workload)
+        
+        reports = {}
+        for mode in ('brut', 'syntheses', 'analytique'):
+            db = RestaurantDatabase(connection_string, use_summaries=(mode == 'syntheses'), cache_size=0)
+            if mode == 'analytique':
+                start = time.perf_counter()
+                snapshot = db.enable_analytics(max_lag=float('inf'))
+                snapshot_seconds = time.perf_counter() - start
+            reports[mode] = {}
+            for name in ANALYTICS_CALLS:
+                call = getattr(db, name)
+                samples = []
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    call()
+                    samples.append(time.perf_counter() - start)
+                reports[mode][name] = _latencies(samples)
+            if mode != 'analytique':
+                db.engine.dispose()
+        
+        # Incremental refresh after a burst of new orders
+        rng = random.Random(seed)
+        orders = []
+        for _ in range(n_orders):
+            _, client_id, _, lignes, _ = workload.commande(rng.randint(1, workload.n_commandes))
+            orders.append({'client_id': client_id, 'lignes': lignes})
+        db.place_orders_batch(orders, check_stock=False)
+        start = time.perf_counter()
+        rows_read = snapshot.refresh()
+        refresh_seconds = time.perf_counter() - start
+        ecarts = db.check_analytics()
+        db.engine.dispose()
+        
+        for name in ANALYTICS_CALLS:
+            line = " | ".join(f"{mode} {reports[mode][name]['median_ms']:>9.2f} ms" for mode in reports)
+            print(f"  {name:<18} | {line}")
+        print(f"  instantane complet {snapshot_seconds * 1000:.1f} ms, "
+              f"rafraichissement apres {n_orders} commandes {refresh_seconds * 1000:.1f} ms, ecarts {len(ecarts)}")
+        
+        runs.append({
+            'scale': scale,
+            'workload': workload.describe(),
+            'reports': reports,
+            'snapshot_s': snapshot_seconds,
+            'incremental_refresh': {'orders': n_orders, 'rows_read': rows_read, 'seconds': refresh_seconds},
+            'mismatches': len(ecarts),
+        })
+    return {'database': _mask_dsn(connection_string), 'repeat': repeat, 'runs': runs}
+
+
+def _best(call, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        call()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def bench_recipes(connection_string, n_lines, plats_counts, repeat=5, jours=28):
+    """Recipe costs and stock forecast from the cached matrix against the equivalent SQL joins."""
+    runs = []
+    for n_plats in plats_counts:
+        workload = WorkloadGenerator.for_lines(n_lines, n_plats=n_plats)
+        print(f"\n{n_plats} plats: {workload.describe()}")
+        _load_dataset(connection_string, workload)
+        db = RestaurantDatabase(connection_string, cache_size=0)
+        pi, ingredients, plats = db.plat_ingredients, db.ingredients, db.plats
+        cout_sql = select(
+            plats.c.id, plats.c.prix, func.sum(pi.c.quantite_necessaire * ingredients.c.cout_unitaire)
+        ).select_from(plats.join(pi).join(ingredients)).group_by(plats.c.id, plats.c.prix)
+        # The last jours of the generated orders, not of the wall clock
+        fin = workload.debut + timedelta(days=workload.jours)
+        besoins_sql = select(
+            pi.c.ingredient_id, func.sum(pi.c.quantite_necessaire * db.commande_plats.c.quantite)
+        ).select_from(
+            db.commande_plats.join(db.commandes).join(pi, pi.c.plat_id == db.commande_plats.c.plat_id)
+        ).where(
+            db.commandes.c.date_commande >= fin - timedelta(days=jours), db.commandes.c.date_commande < fin
+        ).group_by(pi.c.ingredient_id)
+        
+        start = time.perf_counter()
+        db.recipe_costs()
+        matrix_build = time.perf_counter() - start
+        with db.engine.connect() as conn:
+            besoins = conn.execute(besoins_sql).all()
+        prevision = db.stock_forecast(jours=jours, fin=fin)
+        assert besoins, f"Aucune vente sur les {jours} derniers jours de la charge"
+        assert any(ligne.consommation_jour > 0 for ligne in prevision), "Prevision sans consommation"
+        timings = {
+            'couts_sql': _best(lambda: _time_query(db, cout_sql, 1), repeat),
+            'couts_matrice': _best(db.recipe_costs, repeat),
+            'besoins_sql': _best(lambda: _time_query(db, besoins_sql, 1), repeat),
+            'prevision_matrice': _best(lambda: db.stock_forecast(jours=jours, fin=fin), repeat),
+        }
+        db.engine.dispose()
+        
+        print(f"  construction de la matrice {matrix_build * 1000:.1f} ms, {len(besoins)} ingredients consommes")
+        for name, seconds in timings.items():
+            print(f"  {name:<18} | {seconds * 1000:>9.2f} ms")
+        runs.append({'n_plats': n_plats, 'workload': workload.describe(), 'ingredients': len(besoins),
+                     'matrix_build_s': matrix_build, 'best_s': timings})
+    return {'n_lines': n_lines, 'jours': jours, 'repeat': repeat, 'runs': runs}
+
+
+def _search_terms(workload, rng, n_queries):
+    """Type-ahead inputs: growing prefixes of real names, e-mails and review words."""
+    termes = []
+    for _ in range(n_queries):
+        source = rng.choice(('plats', 'clients', 'avis'))
+        if source == 'plats':
+            texte = f"{CATEGORIES[rng.randrange(len(CATEGORIES))]} {rng.randint(1, workload.n_plats)}"
+        elif source == 'clients':
+            client_id = rng.randint(1, workload.n_clients)
+            texte = rng.choice((workload.client_nom(client_id), f'client{client_id}@example.com'))
+        else:
+            texte = rng.choice(rng.choice(list(COMMENTAIRES.values())))
+        termes.append((source, texte[:rng.randint(3, len(texte))]))
+    return termes
+
+
+def bench_search(connection_string, n_lines, n_queries=300, limit=20, seed=42, load=True):
+    """Latency of the ranked type-ahead search against an unindexed LIKE scan."""
+    workload = WorkloadGenerator.for_lines(n_lines)
+    if load:
+        _load_dataset(connection_string, workload)
+    db = RestaurantDatabase(connection_string, cache_size=0)
+    db.create_search_indexes()
+    termes = _search_terms(workload, random.Random(seed), n_queries)
+    
+    samples = {source: [] for source in SEARCH_FIELDS}
+    pages = {source: [] for source in SEARCH_FIELDS}
+    for source, texte in termes:
+        start = time.perf_counter()
+        db.search(texte, source, limit=limit)
+        samples[source].append(time.perf_counter() - start)
+        start = time.perf_counter()
+        db.search(texte, source, limit=limit, offset=limit)
+        pages[source].append(time.perf_counter() - start)
+    
+    like = []
+    with db.engine.connect() as conn:
+        for source, texte in termes[:max(1, n_queries // 10)]:
+            table = db.metadata.tables[source]
+            column = table.c[SEARCH_FIELDS[source][0]]
+            start = time.perf_counter()
+            conn.execute(select(table.c.id, column).where(column.ilike(f'%{texte}%')).limit(limit)).all()
+            like.append(time.perf_counter() - start)
+    db.engine.dispose()
+    
+    results = {'n_lines': n_lines, 'n_queries': n_queries, 'limit': limit, 'sources': {}}
+    for source in SEARCH_FIELDS:
+        if samples[source]:
+            results['sources'][source] = {'page_1': _latencies(samples[source]), 'page_2': _latencies(pages[source])}
+            latency = results['sources'][source]['page_1']
+            print(f"{source:<8} | median {latency['median_ms']:>7.2f} ms | p95 {latency['p95_ms']:>7.2f} ms")
+    results['like_scan'] = _latencies(like)
+    print(f"LIKE '%...%' | median {results['like_scan']['median_ms']:>7.2f} ms")
+    return results
+
+
+def bench_orders(connection_string, n_orders, batch_sizes, seed=42):
+    """Orders per second through place_order and place_orders_batch at several batch sizes."""
+    workload = WorkloadGenerator(n_commandes=10000, seed=seed)
+    _load_dataset(connection_string, workload)
+    db = RestaurantDatabase(connection_string)
+    rng = random.Random(seed)
+    
+    def rush(count):
+        for _ in range(count):
+            commande_id = rng.randint(1, workload.n_commandes)
+            _, client_id, _, lignes, _ = workload.commande(commande_id)
+            yield {'client_id': client_id, 'lignes': lignes}
+    
+    results = {}
+    for batch_size in batch_sizes:
+        orders = list(rush(n_orders))
+        start = time.perf_counter()
+        for offset in range(0, len(orders), batch_size):
+            db.place_orders_batch(orders[offset:offset + batch_size], check_stock=False)
+        elapsed = time.perf_counter() - start
+        results[batch_size] = {'orders': n_orders, 'seconds': elapsed, 'orders_per_sec': n_orders / elapsed}
+        print(f"lot de {batch_size:>5} : {n_orders / elapsed:>10,.0f} commandes/s")
+    
+    ecarts = db.check_summaries()
+    db.engine.dispose()
+    return {'workload': workload.describe(), 'batches': results, 'summary_mismatches': len(ecarts)}
+
+
+def _live_events(workload, n_events, seed):
+    """Orders replayed from the workload, each followed by its avis when the customer leaves one."""
+    rng = random.Random(seed)
+    events = []
+    while len(events) < n_events:
+        _, client_id, _, lignes, _ = workload.commande(rng.randint(1, workload.n_commandes))
+        events.append(('commande', {'client_id': client_id, 'lignes': lignes}))
+        if rng.random() < workload.avis_ratio:
+            note = rng.randint(1, 5)
+            events.append(('avis', {'client_id': client_id, 'plat_id': rng.choice(list(lignes)),
+                                    'note': note, 'commentaire': rng.choice(COMMENTAIRES[note])}))
+    return events[:n_events]
+
+
+def _run_producers(events, producers, submit):
+    """Split events across producer threads and time every submit call."""
+    samples = [[] for _ in range(producers)]
+    
+    def produce(index):
+        for kind, payload in events[index::producers]:
+            start = time.perf_counter()
+            submit(kind, payload)
+            samples[index].append(time.perf_counter() - start)
+    
+    threads = [threading.Thread(target=produce, args=(index,)) for index in range(producers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return [sample for thread_samples in samples for sample in thread_samples]
+
+
+def bench_write_behind(connection_string, n_events, batch_sizes, producers=4, max_delay=0.05, seed=42):
+    """Commits and events per second: one transaction per event against the write-behind queue."""
+    workload = WorkloadGenerator(n_commandes=10000, seed=seed)
+    _load_dataset(connection_string, workload)
+    db = RestaurantDatabase(connection_string, cache_size=0)
+    commits = [0]
+    sqlalchemy.event.listen(db.engine, 'commit', lambda conn: commits.__setitem__(0, commits[0] + 1))
+    events = _live_events(workload, n_events, seed)
+    
+    def direct(kind, payload):
+        if kind == 'avis':
+            db.add_avis_batch([payload])
+        else:
+            db.place_orders_batch([payload], check_stock=False)
+    
+    runs = [('direct', None)] + [('write_behind', batch_size) for batch_size in batch_sizes]
+    results = []
+    for mode, batch_size in runs:
+        commits[0] = 0
+        start = time.perf_counter()
+        if mode == 'direct':
+            submits = _run_producers(events, producers, direct)
+            stats = {}
+        else:
+            writer = db.write_behind(max_batch=batch_size, max_delay=max_delay, check_stock=False)
+            
+            def submit(kind, payload):
+                if kind == 'avis':
+                    writer.submit_avis(**payload)
+                else:
+                    writer.submit_order(**payload)
+            
+            submits = _run_producers(events, producers, submit)
+            writer.close()
+            stats = writer.stats()
+        elapsed = time.perf_counter() - start
+        run = {
+            'mode': mode, 'max_batch': batch_size, 'events': n_events, 'seconds': elapsed,
+            'events_per_sec': n_events / elapsed, 'commits': commits[0], 'submit': _latencies(submits),
+            'queue': stats,
+        }
+        results.append(run)
+        label = mode if batch_size is None else f"{mode} ({batch_size})"
+        print(f"{label:<20} | {run['events_per_sec']:>9,.0f} evenements/s | {run['commits']:>7} commits | "
+              f"submit p95 {run['submit']['p95_ms']:>7.3f} ms")
+    
+    ecarts = db.check_summaries()
+    db.engine.dispose()
+    return {'workload': workload.describe(), 'producers': producers, 'max_delay': max_delay,
+            'runs': results, 'summary_mismatches': len(ecarts)}
+
+
+def bench_export(connection_string, n_lines, formats, batch_size, directory, load=True):
+    """Rows per second of the streaming export for the biggest tables and a report."""
+    workload = WorkloadGenerator.for_lines(n_lines)
+    if load:
+        _load_dataset(connection_string, workload)
+    db = RestaurantDatabase(connection_string)
+    os.makedirs(directory, exist_ok=True)
+    
+    results = []
+    for source, order_by in (('commande_plats', None), ('commandes', 'date_commande'), ('clients_fideles', None)):
+        for format in formats:
+            path = os.path.join(directory, f"{source}.{format}")
+            stats = db.export(source, path, format=format, batch_size=batch_size, order_by=order_by, resume=False)
+            stats['bytes'] = os.path.getsize(path)
+            results.append(stats)
+            print(f"{source:<16} {format:<8} | {stats['rows']:>10} lignes | {stats['rows_per_sec']:>12,.0f} lignes/s")
+    db.engine.dispose()
+    return {'n_lines': n_lines, 'batch_size': batch_size, 'exports': results}
+
+
+STARTUP_SCENARIOS = {
+    'interpreter': "pass",
+    'import': "import SQL_Python_sol",
+    'eager': "from SQL_Python_sol import RestaurantDatabase; RestaurantDatabase({url!r}, cache_size=0)",
+    'lazy': "from SQL_Python_sol import RestaurantDatabase; RestaurantDatabase({url!r}, cache_size=0, lazy=True)",
+    'lazy_first_query': (
+        "from SQL_Python_sol import RestaurantDatabase; "
+        "RestaurantDatabase({url!r}, cache_size=0, lazy=True).plats_par_categorie()"
+    ),
+}
+
+
+def bench_startup(connection_string, repeat=10):
+    """Cold-start latency: each scenario runs in a fresh interpreter, as a CLI or cron job would."""
+    db = RestaurantDatabase(connection_string, lazy=True)
+    db.create_tables()
+    db.dispose()
+    
+    here = os.path.dirname(os.path.abspath(__file__))
+    results = {}
+    for name, code in STARTUP_SCENARIOS.items():
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, '-c', code.format(url=connection_string)], cwd=here, check=True)
+            samples.append((time.perf_counter() - start) * 1000)
+        results[name] = {'median_ms': statistics.median(samples), 'min_ms': min(samples)}
+    
+    base = results['interpreter']['median_ms']
+    for name, stats in results.items():
+        stats['over_interpreter_ms'] = stats['median_ms'] - base
+        print(f"{name:<18} | median {stats['median_ms']:>8.1f} ms | +{stats['over_interpreter_ms']:>7.1f} ms")
+    return {'repeat': repeat, 'scenarios': results}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks du systeme de gestion de restaurant")
+    parser.add_argument('--url', default='sqlite:///restaurant_bench.db', help="URL SQLAlchemy de la base de test")
+    parser.add_argument('--output', help="Fichier JSON pour les resultats")
+    subparsers = parser.add_subparsers(dest='bench', required=True)
+    
+    indexes = subparsers.add_parser('indexes', help="Gain des index sur les requetes d'exemple")
+    indexes.add_argument('--lines', type=int, default=2_000_000, help="Nombre de lignes de commande")
+    indexes.add_argument('--repeat', type=int, default=3)
+    
+    async_reports = subparsers.add_parser('async', help="Rapports en sequentiel contre asyncio.gather")
+    async_reports.add_argument('--lines', type=int, default=500_000, help="Nombre de lignes de commande")
+    async_reports.add_argument('--repeat', type=int, default=5)
+    async_reports.add_argument('--summaries', action='store_true', help="Lire les tables de synthese")
+    async_reports.add_argument('--no-load', action='store_true', help="Reutiliser les donnees deja chargees")
+    
+    suite = subparsers.add_parser('suite', help="Chargement, rapports et lookups a plusieurs echelles")
+    suite.add_argument('--scales', type=float, nargs='+', default=[0.1, 1, 10],
+                       help="Facteurs d'echelle (1 = 10 000 commandes)")
+    suite.add_argument('--repeat', type=int, default=5)
+    suite.add_argument('--lookups', type=int, default=200)
+    suite.add_argument('--seed', type=int, default=42)
+    
+    orders = subparsers.add_parser('orders', help="Debit de place_orders_batch selon la taille des lots")
+    orders.add_argument('--orders', type=int, default=20000)
+    orders.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 100, 1000])
+    
+    write_behind = subparsers.add_parser('write-behind', help="Commits et debit de la file d'ecriture differee")
+    write_behind.add_argument('--events', type=int, default=20000, help="Avis et commandes soumis")
+    write_behind.add_argument('--batch-sizes', type=int, nargs='+', default=[100, 1000])
+    write_behind.add_argument('--producers', type=int, default=4, help="Threads producteurs")
+    write_behind.add_argument('--max-delay', type=float, default=0.05, help="Attente maximale d'un lot (s)")
+    
+    export = subparsers.add_parser('export', help="Debit de l'export en flux (CSV/JSONL/Parquet)")
+    export.add_argument('--lines', type=int, default=1_000_000, help="Nombre de lignes de commande")
+    export.add_argument('--formats', nargs='+', default=['csv', 'jsonl'], choices=['csv', 'jsonl', 'parquet'])
+    export.add_argument('--batch-size', type=int, default=10000)
+    export.add_argument('--dir', default='bench_exports', help="Repertoire des fichiers exportes")
+    export.add_argument('--no-load', action='store_true', help="Reutiliser les donnees deja chargees")
+    
+    analytics = subparsers.add_parser('analytics', help="Rapports agreges en SQL contre l'instantane NumPy")
+    analytics.add_argument('--scales', type=float, nargs='+', default=[0.1, 1, 10],
+                           help="Facteurs d'echelle (1 = 10 000 commandes)")
+    analytics.add_argument('--repeat', type=int, default=5)
+    analytics.add_argument('--orders', type=int, default=500, help="Commandes ajoutees avant le rafraichissement")
+    analytics.add_argument('--seed', type=int, default=42)
+    
+    recipes = subparsers.add_parser('recipes', help="Couts matiere et prevision de stock par la matrice des recettes")
+    recipes.add_argument('--lines', type=int, default=1_000_000, help="Nombre de lignes de commande")
+    recipes.add_argument('--plats', type=int, nargs='+', default=[100, 1000, 5000], help="Tailles de carte")
+    recipes.add_argument('--repeat', type=int, default=5)
+    recipes.add_argument('--jours', type=int, default=28, help="Historique utilise pour la prevision")
+    
+    search = subparsers.add_parser('search', help="Latence de la recherche plein texte")
+    search.add_argument('--lines', type=int, default=1_000_000, help="Nombre de lignes de commande")
+    search.add_argument('--queries', type=int, default=300)
+    search.add_argument('--limit', type=int, default=20)
+    search.add_argument('--no-load', action='store_true', help="Reutiliser les donnees deja chargees")
+    
+    startup = subparsers.add_parser('startup', help="Temps de demarrage a froid (import, connexion paresseuse)")
+    startup.add_argument('--repeat', type=int, default=10)
+    
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO)
+    
+    if args.bench == 'indexes':
+        results = bench_indexes(args.url, args.lines, args.repeat)
+    elif args.bench == 'async':
+        results = bench_async(args.url, args.lines, args.repeat, args.summaries, not args.no_load)
+    elif args.bench == 'orders':
+        results = bench_orders(args.url, args.orders, args.batch_sizes)
+    elif args.bench == 'write-behind':
+        results = bench_write_behind(args.url, args.events, args.batch_sizes, args.producers, args.max_delay)
+    elif args.bench == 'export':
+        results = bench_export(args.url, args.lines, args.formats, args.batch_size, args.dir, not args.no_load)
+    elif args.bench == 'analytics':
+        results = bench_analytics(args.url, args.scales, args.repeat, args.orders, args.seed)
+    elif args.bench == 'recipes':
+        results = bench_recipes(args.url, args.lines, args.plats, args.repeat, args.jours)
+    elif args.bench == 'search':
+        results = bench_search(args.url, args.lines, args.queries, args.limit, load=not args.no_load)
+    elif args.bench == 'startup':
+        results = bench_startup(args.url, args.repeat)
+    elif args.bench == 'suite':
+        results = bench_suite(args.url, args.scales, args.repeat, args.lookups, args.seed)
+    
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, default=str)
+        print(f"\nResultats ecrits dans {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
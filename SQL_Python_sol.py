@@ -1,351 +1,3536 @@
 from sqlalchemy import (
-    create_engine, MetaData, Table, Column, Integer, String, 
-    Numeric, DateTime, Text, ForeignKey, insert, select, func, delete
+    create_engine, event, exc, DDL, MetaData, Table, Column, Integer, String, 
+    Numeric, DateTime, Text, ForeignKey, ForeignKeyConstraint, Index, bindparam, case, insert, literal_column, select, func, delete, text, tuple_
 )
-from datetime import datetime
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import NullPool, QueuePool
+from collections import OrderedDict, defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor, as_completed, TimeoutError as FuturesTimeout
+from datetime import datetime, timedelta
+from decimal import Decimal
+from functools import lru_cache
+from itertools import islice
+import argparse
+import asyncio
+import csv
+import hashlib
+import io
+import json
 import logging
+import math
 import os
+import queue
+import re
 import sys
+import threading
+import time
+import weakref
+from typing import NamedTuple
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-class RestaurantDatabase:
-    def __init__(self, connection_string):
+# Parents before children so every foreign key already exists when a table is loaded
+TABLE_LOAD_ORDER = [
+    'categories', 'fournisseurs',
+    'plats', 'clients', 'ingredients',
+    'commandes',
+    'commande_plats', 'plat_ingredients',
+    'avis',
+]
+
+# Natural keys used by sync() instead of the primary key, for feeds that do not share our ids
+SYNC_KEYS = {
+    'clients': ('email',),
+}
+
+# Searchable text columns per table; the first one is the result title
+SEARCH_FIELDS = {
+    'plats': ('nom', 'description'),
+    'clients': ('nom', 'email'),
+    'avis': ('commentaire',),
+}
+
+# Matches ranked per search tier, newest first: ranking costs a few microseconds per
+# matched row, and a 2-3 letter prefix can match every row of a table
+SEARCH_RANKED_ROWS = 500
+
+# Tables range-partitioned by month on PostgreSQL, with their partition key. Children
+# come first so detaching a month never strands rows that reference it.
+PARTITIONED_TABLES = {
+    'commande_plats': 'date_commande',
+    'avis': 'date_avis',
+    'commandes': 'date_commande',
+}
+
+# Open bounds used when a period report only gets one of debut/fin
+PERIODE_MIN = datetime(1900, 1, 1)
+PERIODE_MAX = datetime(9999, 12, 31)
+
+# Raw tables whose writes change the precomputed report tables
+SUMMARY_SOURCES = {'plats', 'categories', 'commandes', 'commande_plats', 'avis'}
+
+# Columns the summary tables aggregate; a sync touching only other columns leaves them valid
+SUMMARY_COLUMNS = {
+    'plats': ('prix', 'categorie_id'),
+    'commandes': ('client_id', 'total'),
+    'commande_plats': ('plat_id', 'quantite'),
+    'avis': ('plat_id', 'note'),
+}
+
+
+# Tables each report reads; a write to any of them invalidates its cached results
+REPORT_TABLES = {
+    'plats_par_categorie': {'plats', 'categories'},
+    'commandes_client': {'commandes', 'clients'},
+    'top_plats': {'plats', 'commande_plats'},
+    'ca_par_categorie': {'plats', 'categories', 'commande_plats'},
+    'clients_fideles': {'clients', 'commandes'},
+    'notes_moyennes': {'plats', 'avis'},
+    'top_plats_periode': {'plats', 'commandes', 'commande_plats'},
+    'ca_par_categorie_periode': {'plats', 'categories', 'commandes', 'commande_plats'},
+    'clients_fideles_periode': {'clients', 'commandes'},
+    'notes_moyennes_periode': {'plats', 'avis'},
+}
+
+
+class PlatCategorie(NamedTuple):
+    plat: str
+    prix: Decimal
+    categorie: str
+
+
+class CommandeClient(NamedTuple):
+    commande_id: int
+    date_commande: datetime
+    total: Decimal
+
+
+class TopPlat(NamedTuple):
+    plat: str
+    total_commande: int
+
+
+class ChiffreAffairesCategorie(NamedTuple):
+    categorie: str
+    ca: Decimal
+
+
+class ClientFidele(NamedTuple):
+    client: str
+    nb_commandes: int
+    total_depense: Decimal
+
+
+class NotePlat(NamedTuple):
+    plat: str
+    note_moyenne: float
+    nb_avis: int
+
+
+class CommandePlacee(NamedTuple):
+    commande_id: int
+    client_id: int
+    date_commande: datetime
+    total: Decimal
+
+
+class CoutPlat(NamedTuple):
+    plat: str
+    prix: Decimal
+    cout_matiere: Decimal
+    marge: Decimal
+    taux_marge: float
+
+
+class PrevisionStock(NamedTuple):
+    ingredient: str
+    fournisseur: str
+    stock: Decimal
+    consommation_jour: Decimal
+    jours_restants: float
+    point_commande: Decimal
+    a_commander: Decimal
+
+
+class ResultatRecherche(NamedTuple):
+    id: int
+    titre: str
+    detail: str
+    score: float
+
+
+REPORT_ROW_TYPES = {
+    'plats_par_categorie': PlatCategorie,
+    'commandes_client': CommandeClient,
+    'top_plats': TopPlat,
+    'ca_par_categorie': ChiffreAffairesCategorie,
+    'clients_fideles': ClientFidele,
+    'notes_moyennes': NotePlat,
+    'top_plats_periode': TopPlat,
+    'ca_par_categorie_periode': ChiffreAffairesCategorie,
+    'clients_fideles_periode': ClientFidele,
+    'notes_moyennes_periode': NotePlat,
+}
+
+
+class QueryCache:
+    """Thread-safe LRU cache with a TTL, invalidated by the tables a result depends on."""
+    
+    def __init__(self, maxsize=256, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+    
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+    
+    def put(self, key, value, tables):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value, frozenset(tables))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+    
+    def invalidate(self, tables=None):
+        with self._lock:
+            if tables is None:
+                stale = list(self._entries)
+            else:
+                tables = set(tables)
+                stale = [key for key, entry in self._entries.items() if entry[2] & tables]
+            for key in stale:
+                del self._entries[key]
+            self.invalidations += len(stale)
+    
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+
+class PoolMetrics:
+    """Counters fed by the engine's pool events, exported with snapshot()."""
+    
+    # One instance per engine, so instances sharing an engine don't stack listeners on it
+    _engines = weakref.WeakKeyDictionary()
+    _engines_lock = threading.RLock()
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.checkouts = 0
+        self.checkins = 0
+        self.connects = 0
+        self.connect_seconds = 0.0
+        self.connect_max = 0.0
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.wait_max = 0.0
+        self.overflow_checkouts = 0
+        self.overflow_max = 0
+        self.invalidations = 0
+        self.soft_invalidations = 0
+        self.pre_pings = 0
+        self.pre_ping_failures = 0
+        self.pre_ping_idle = None
+        self.pool = None
+    
+    @classmethod
+    def for_engine(cls, engine):
+        """The metrics already attached to engine, or new ones attached now."""
+        with cls._engines_lock:
+            metrics = cls._engines.get(engine)
+            if metrics is None:
+                metrics = cls()
+                metrics.attach(engine, None)
+            return metrics
+    
+    def attach(self, engine, pre_ping_idle=None):
+        with self._engines_lock:
+            if engine in self._engines:
+                raise ValueError("Metriques de pool deja attachées a ce moteur")
+            self._engines[engine] = self
+        self.pool = engine.pool
+        self.pre_ping_idle = pre_ping_idle
+        event.listen(engine, 'do_connect', self._on_do_connect)
+        event.listen(engine, 'connect', self._on_connect)
+        event.listen(engine, 'checkout', self._on_checkout)
+        event.listen(engine, 'checkin', self._on_checkin)
+        event.listen(engine, 'invalidate', self._on_invalidate)
+        event.listen(engine, 'soft_invalidate', self._on_soft_invalidate)
+    
+    def _on_do_connect(self, dialect, conn_rec, cargs, cparams):
+        self._local.connect_start = time.perf_counter()
+    
+    def _on_connect(self, dbapi_connection, connection_record):
+        start = getattr(self._local, 'connect_start', None)
+        if start is None:
+            return
+        elapsed = time.perf_counter() - start
+        self._local.connect_start = None
+        self._local.connect_in_checkout = getattr(self._local, 'connect_in_checkout', 0.0) + elapsed
+        with self._lock:
+            self.connects += 1
+            self.connect_seconds += elapsed
+            self.connect_max = max(self.connect_max, elapsed)
+    
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        idle_since = connection_record.info.pop('checked_in_at', None)
+        if (self.pre_ping_idle is not None and idle_since is not None
+                and time.monotonic() - idle_since >= self.pre_ping_idle):
+            self._ping(dbapi_connection)
+        
+        overflow = self.pool.overflow() if isinstance(self.pool, QueuePool) else 0
+        with self._lock:
+            self.checkouts += 1
+            if overflow > 0:
+                self.overflow_checkouts += 1
+                self.overflow_max = max(self.overflow_max, overflow)
+    
+    def _ping(self, dbapi_connection):
+        with self._lock:
+            self.pre_pings += 1
+        cursor = dbapi_connection.cursor()
+        try:
+            cursor.execute("SELECT 1")
+        except Exception:
+            with self._lock:
+                self.pre_ping_failures += 1
+            # The pool discards this connection and retries the checkout with a fresh one
+            raise exc.DisconnectionError()
+        finally:
+            try:
+                cursor.close()
+            except Exception:
+                pass
+    
+    def _on_checkin(self, dbapi_connection, connection_record):
+        connection_record.info['checked_in_at'] = time.monotonic()
+        with self._lock:
+            self.checkins += 1
+    
+    def _on_invalidate(self, dbapi_connection, connection_record, exception):
+        with self._lock:
+            self.invalidations += 1
+    
+    def _on_soft_invalidate(self, dbapi_connection, connection_record, exception):
+        with self._lock:
+            self.soft_invalidations += 1
+    
+    def start_wait(self):
+        self._local.connect_in_checkout = 0.0
+        return time.perf_counter()
+    
+    def end_wait(self, start):
+        # Time spent opening a brand new connection is reported as connect latency, not wait
+        elapsed = time.perf_counter() - start - getattr(self._local, 'connect_in_checkout', 0.0)
+        elapsed = max(elapsed, 0.0)
+        with self._lock:
+            self.waits += 1
+            self.wait_seconds += elapsed
+            self.wait_max = max(self.wait_max, elapsed)
+    
+    def snapshot(self):
+        with self._lock:
+            snapshot = {
+                'checkouts': self.checkouts,
+                'checkins': self.checkins,
+                'checked_out': self.checkouts - self.checkins,
+                'connects': self.connects,
+                'connect_avg_ms': self.connect_seconds / self.connects * 1000 if self.connects else 0.0,
+                'connect_max_ms': self.connect_max * 1000,
+                'wait_total_ms': self.wait_seconds * 1000,
+                'wait_avg_ms': self.wait_seconds / self.waits * 1000 if self.waits else 0.0,
+                'wait_max_ms': self.wait_max * 1000,
+                'overflow_checkouts': self.overflow_checkouts,
+                'overflow_max': self.overflow_max,
+                'invalidations': self.invalidations,
+                'soft_invalidations': self.soft_invalidations,
+                'pre_pings': self.pre_pings,
+                'pre_ping_failures': self.pre_ping_failures,
+            }
+        if self.pool is not None:
+            snapshot['pool_status'] = self.pool.status()
+        return snapshot
+
+
+_SQL_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b|%\(\w+\)s|%s|(?<!:):\w+|\?")
+_SQL_LISTS = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_SQL_ROWS = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)(?:\s*,\s*\(\s*\?(?:\s*,\s*\?)*\s*\))+")
+
+
+@lru_cache(maxsize=2048)
+def normalize_sql(statement):
+    """Reduce a statement to its shape: literals and placeholders become ?, lists collapse."""
+    sql = " ".join(statement.split())
+    sql = _SQL_LITERALS.sub("?", sql)
+    sql = _SQL_ROWS.sub("(...), ...", sql)
+    return _SQL_LISTS.sub("(?, ...)", sql)
+
+
+class QueryProfiler:
+    """Per-statement latency histograms and a slow-query log fed by cursor execute events.
+    
+    Nothing is registered on the engine until attach() is called, so a
+    database that never enables profiling pays nothing on the hot path.
+    """
+    
+    def __init__(self, slow_ms=100.0, explain_slow=False, max_slow=200):
+        self.slow_ms = slow_ms
+        self.explain_slow = explain_slow
+        self.slow_queries = deque(maxlen=max_slow)
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._engines = []
+    
+    def attach(self, engine):
+        event.listen(engine, 'before_cursor_execute', self._before)
+        event.listen(engine, 'after_cursor_execute', self._after)
+        self._engines.append(engine)
+    
+    def detach(self):
+        for engine in self._engines:
+            event.remove(engine, 'before_cursor_execute', self._before)
+            event.remove(engine, 'after_cursor_execute', self._after)
+        self._engines = []
+    
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+            self.slow_queries.clear()
+    
+    def _before(self, conn, cursor, statement, parameters, context, executemany):
+        # Kept on the execution context, which dies with the statement even when it fails;
+        # conn.info would outlive it on the pooled connection
+        if context is not None:
+            context._query_start = time.perf_counter()
+    
+    def _after(self, conn, cursor, statement, parameters, context, executemany):
+        start = getattr(context, '_query_start', None)
+        if start is None:
+            return
+        elapsed = time.perf_counter() - start
+        key = normalize_sql(statement)
+        # Bucket b holds latencies below 2**b microseconds
+        bucket = int(elapsed * 1_000_000).bit_length()
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = {'calls': 0, 'total': 0.0, 'max': 0.0, 'buckets': defaultdict(int)}
+            stats['calls'] += 1
+            stats['total'] += elapsed
+            stats['max'] = max(stats['max'], elapsed)
+            stats['buckets'][bucket] += 1
+        
+        if elapsed * 1000 >= self.slow_ms:
+            self._log_slow(conn, cursor, statement, parameters, executemany, elapsed)
+    
+    def _log_slow(self, conn, cursor, statement, parameters, executemany, elapsed):
+        entry = {
+            'sql': statement,
+            'normalized': normalize_sql(statement),
+            'parameters': repr(parameters)[:500],
+            'ms': elapsed * 1000,
+            'at': datetime.now().isoformat(timespec='milliseconds'),
+            'plan': None,
+        }
+        if self.explain_slow and not executemany and statement.lstrip()[:6].upper() == 'SELECT':
+            entry['plan'] = self._explain(conn, cursor, statement, parameters)
+        self.slow_queries.append(entry)
+        logger.warning(f"Requete lente ({entry['ms']:.1f} ms): {entry['normalized'][:200]}")
+    
+    def _explain(self, conn, cursor, statement, parameters):
+        # A raw cursor keeps the EXPLAIN itself out of the statistics
+        prefix = 'EXPLAIN ANALYZE ' if conn.dialect.name == 'postgresql' else 'EXPLAIN QUERY PLAN '
+        explain_cursor = cursor.connection.cursor()
+        try:
+            explain_cursor.execute(prefix + statement, parameters)
+            return "\n".join(str(row[-1]) for row in explain_cursor.fetchall())
+        except Exception as e:
+            return f"EXPLAIN impossible: {e}"
+        finally:
+            explain_cursor.close()
+    
+    @staticmethod
+    def _percentile(buckets, calls, fraction, maximum):
+        target = calls * fraction
+        seen = 0
+        for bucket in sorted(buckets):
+            seen += buckets[bucket]
+            if seen >= target:
+                # The bucket bound can overshoot the slowest call actually seen
+                return min((2 ** bucket) / 1000, maximum)
+        return 0.0
+    
+    def summary(self, top=None, order_by='total_ms'):
+        """One dict per normalized statement; percentiles are histogram upper bounds in ms."""
+        with self._lock:
+            items = [(key, dict(stats, buckets=dict(stats['buckets']))) for key, stats in self._stats.items()]
+        rows = []
+        for key, stats in items:
+            rows.append({
+                'sql': key,
+                'calls': stats['calls'],
+                'total_ms': stats['total'] * 1000,
+                'mean_ms': stats['total'] / stats['calls'] * 1000,
+                'max_ms': stats['max'] * 1000,
+                'p50_ms': self._percentile(stats['buckets'], stats['calls'], 0.50, stats['max'] * 1000),
+                'p95_ms': self._percentile(stats['buckets'], stats['calls'], 0.95, stats['max'] * 1000),
+                'p99_ms': self._percentile(stats['buckets'], stats['calls'], 0.99, stats['max'] * 1000),
+                'histogram_us': {f"<{2 ** bucket}": count for bucket, count in sorted(stats['buckets'].items())},
+            })
+        rows.sort(key=lambda row: row[order_by], reverse=True)
+        return rows[:top] if top else rows
+    
+    def format_summary(self, top=20):
+        lines = [f"{'appels':>7} | {'total ms':>10} | {'moy ms':>8} | {'p95 ms':>8} | {'max ms':>8} | requete"]
+        lines.append("-" * 100)
+        for row in self.summary(top):
+            lines.append(
+                f"{row['calls']:>7} | {row['total_ms']:>10.2f} | {row['mean_ms']:>8.2f} | "
+                f"{row['p95_ms']:>8.2f} | {row['max_ms']:>8.2f} | {row['sql'][:120]}"
+            )
+        if self.slow_queries:
+            lines.append(f"\n{len(self.slow_queries)} requete(s) au-dessus de {self.slow_ms} ms")
+        return "\n".join(lines)
+    
+    def dump(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'summary': self.summary(), 'slow_queries': list(self.slow_queries)}, f, indent=2)
+
+
+class MeteredQueuePool(QueuePool):
+    """QueuePool that reports how long each checkout waited for a connection."""
+    
+    metrics = None
+    
+    def connect(self):
+        if self.metrics is None:
+            return super().connect()
+        start = self.metrics.start_wait()
+        try:
+            return super().connect()
+        finally:
+            self.metrics.end_wait(start)
+    
+    def recreate(self):
+        pool = super().recreate()
+        pool.metrics = self.metrics
+        if self.metrics is not None:
+            self.metrics.pool = pool
+        return pool
+
+
+def _export_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+class _CsvExportWriter:
+    def __init__(self, path, columns, append, types=None):
+        self.file = open(path, 'a' if append else 'w', newline='', encoding='utf-8')
+        self.writer = csv.writer(self.file)
+        if not append:
+            self.writer.writerow(columns)
+    
+    def write(self, rows):
+        self.writer.writerows([[_export_value(value) for value in row] for row in rows])
+        self.file.flush()
+        return self.file.tell()
+    
+    def durable(self):
+        return True
+    
+    def close(self, complete=True):
+        self.file.close()
+
+
+class _JsonlExportWriter:
+    def __init__(self, path, columns, append, types=None):
+        self.file = open(path, 'a' if append else 'w', encoding='utf-8')
+        self.columns = columns
+    
+    def write(self, rows):
+        for row in rows:
+            self.file.write(json.dumps(
+                {name: _export_value(value) for name, value in zip(self.columns, row)},
+                ensure_ascii=False
+            ))
+            self.file.write("\n")
+        self.file.flush()
+        return self.file.tell()
+    
+    def durable(self):
+        return True
+    
+    def close(self, complete=True):
+        self.file.close()
+
+
+def _arrow_type(pa, sql_type):
+    if isinstance(sql_type, Integer):
+        return pa.int64()
+    if isinstance(sql_type, Numeric):
+        if not sql_type.asdecimal:
+            return pa.float64()
+        # Full precision: report sums can outgrow the precision of the summed column
+        return pa.decimal128(38, sql_type.scale or 0)
+    if isinstance(sql_type, DateTime):
+        return pa.timestamp('us')
+    if isinstance(sql_type, String):
+        return pa.string()
+    return None
+
+
+class _ParquetExportWriter:
+    # A Parquet file is unreadable until its footer is written and cannot be appended to,
+    # so rows go to numbered part files (path, stem.1.ext, ...) written under a .tmp name
+    # and renamed once closed. durable() is only true between parts, and export only
+    # moves its checkpoint past rows that are in a closed part.
+    part_rows = 1_000_000
+    
+    def __init__(self, path, columns, append, types=None):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ImportError("L'export Parquet necessite pyarrow (pip install pyarrow)")
+        self.pa = pa
+        self.pq = pq
+        self.columns = columns
+        self.types = [_arrow_type(pa, sql_type) for sql_type in types] if types else [None] * len(columns)
+        self.stem, self.ext = os.path.splitext(path)
+        self.part = 0
+        if append:
+            while os.path.exists(self._part_path(self.part)):
+                self.part += 1
+        else:
+            # Parts left by an earlier export of the same file would mix with this one
+            stale = 1
+            while os.path.exists(self._part_path(stale)):
+                os.remove(self._part_path(stale))
+                stale += 1
+        self.schema = None
+        self.writer = None
+        self.part_size = 0
+    
+    def _part_path(self, part):
+        return f"{self.stem}{self.ext}" if part == 0 else f"{self.stem}.{part}{self.ext}"
+    
+    def write(self, rows):
+        if self.schema is None:
+            # Columns whose SQL type has no Arrow mapping (e.g. avg()) take the type of their first values
+            self.schema = self.pa.schema([
+                (name, arrow_type if arrow_type is not None else self.pa.array([row[i] for row in rows]).type)
+                for i, (name, arrow_type) in enumerate(zip(self.columns, self.types))
+            ])
+        batch = self.pa.Table.from_pylist([dict(zip(self.columns, row)) for row in rows], schema=self.schema)
+        if self.writer is None:
+            self.writer = self.pq.ParquetWriter(self._part_path(self.part) + '.tmp', self.schema)
+        self.writer.write_table(batch)
+        self.part_size += len(rows)
+        if self.part_size >= self.part_rows:
+            self._close_part()
+        return None
+    
+    def _close_part(self):
+        self.writer.close()
+        os.replace(self._part_path(self.part) + '.tmp', self._part_path(self.part))
+        self.writer = None
+        self.part += 1
+        self.part_size = 0
+    
+    def durable(self):
+        return self.writer is None
+    
+    def close(self, complete=True):
+        if self.writer is None:
+            return
+        if complete:
+            self._close_part()
+        else:
+            # Rows past the last checkpoint: a resumed export writes them again
+            self.writer.close()
+            os.remove(self._part_path(self.part) + '.tmp')
+            self.writer = None
+
+
+EXPORT_WRITERS = {
+    'csv': _CsvExportWriter,
+    'jsonl': _JsonlExportWriter,
+    'parquet': _ParquetExportWriter,
+}
+
+
+# Aggregate reports the columnar snapshot can answer; the others always run in SQL
+ANALYTICS_REPORTS = {
+    'top_plats', 'ca_par_categorie', 'clients_fideles', 'notes_moyennes',
+    'top_plats_periode', 'ca_par_categorie_periode', 'clients_fideles_periode', 'notes_moyennes_periode',
+}
+
+
+class ColumnarSnapshot:
+    """In-process NumPy copy of the reporting tables, answering the aggregate reports without SQL.
+    
+    plats and categories are reread on every refresh; clients, commandes and avis are
+    appended past an id watermark, commande_plats past the commande watermark. Money
+    is held in integer cents so the sums match the database to the cent.
+    
+    A serial id is handed out before its transaction commits, so a row committed late
+    below a watermark is not appended. At most every verify_every seconds the rows at
+    or below each watermark are counted and a table whose count differs is reloaded.
+    """
+    
+    APPENDED_TABLES = ('clients', 'commandes', 'commande_plats', 'avis')
+    
+    def __init__(self, db, max_lag=1.0, verify_every=60.0):
         try:
-            self.engine = create_engine(
-                connection_string, 
-                echo=False,
-                pool_pre_ping=True,
-                pool_recycle=300,
-                connect_args={
-                    "connect_timeout": 10,
-                    "application_name": "restaurant_management_system"
+            import numpy as np
+        except ImportError:
+            raise ImportError("Le mode analytique necessite numpy (pip install numpy)")
+        self.np = np
+        self.db = db
+        self.max_lag = max_lag
+        self.verify_every = verify_every
+        self.refreshed_at = None
+        self.verified_at = time.monotonic()
+        self.refreshes = 0
+        self._lock = threading.RLock()
+        self._stale = True
+        self._reload = set(self.APPENDED_TABLES)
+        self._columns = {}
+        self._watermarks = {}
+    
+    def invalidate(self, tables, reload=False):
+        """Mark the snapshot out of date; reload=True when rows may have been updated or deleted."""
+        with self._lock:
+            self._stale = True
+            if reload:
+                self._reload.update(set(tables) & set(self.APPENDED_TABLES))
+    
+    def _ids(self, values):
+        return self.np.fromiter(values, dtype=self.np.int64, count=len(values))
+    
+    def _cents(self, values):
+        return self.np.fromiter((int(value * 100) for value in values), dtype=self.np.int64, count=len(values))
+    
+    def _dates(self, values):
+        return self.np.array(values, dtype='datetime64[us]')
+    
+    def _names(self, values):
+        return self.np.array(values, dtype=object)
+    
+    def _read(self, conn, query, converters):
+        rows = conn.execute(query).all()
+        values = list(zip(*rows)) or [()] * len(converters)
+        return {name: convert(column) for (name, convert), column in zip(converters.items(), values)}, len(rows)
+    
+    def _append(self, table_name, columns, reload):
+        current = self._columns.get(table_name)
+        if reload or current is None:
+            self._columns[table_name] = columns
+        else:
+            self._columns[table_name] = {
+                name: self.np.concatenate([current[name], values]) for name, values in columns.items()
+            }
+    
+    def _read_appended(self, conn, table, converters, reload):
+        query = select(*(table.c[name] for name in converters))
+        if not reload:
+            query = query.where(table.c.id > self._watermarks[table.name])
+        columns, count = self._read(conn, query.order_by(table.c.id), converters)
+        self._append(table.name, columns, reload)
+        ids = self._columns[table.name]['id']
+        self._watermarks[table.name] = int(ids[-1]) if len(ids) else 0
+        return count
+    
+    def _missed(self, conn):
+        """Appended tables holding fewer (or more) rows at or below their watermark than the database."""
+        db = self.db
+        checks = {
+            name: (getattr(db, name).c.id, self._columns[name]['id'])
+            for name in ('clients', 'commandes', 'avis')
+        }
+        checks['commande_plats'] = (db.commande_plats.c.commande_id, self._columns['commande_plats']['commande_id'])
+        counts = conn.execute(select(*(
+            select(func.count()).where(column <= self._watermarks[name]).scalar_subquery()
+            for name, (column, _) in checks.items()
+        ))).one()
+        return {name for (name, (_, values)), count in zip(checks.items(), counts) if count != len(values)}
+    
+    def refresh(self, full=False):
+        """Bring the snapshot up to date and return the number of rows read."""
+        db = self.db
+        with self._lock:
+            start = time.perf_counter()
+            reload = set(self.APPENDED_TABLES) if full or not self._columns else set(self._reload)
+            if 'commandes' in reload:
+                reload.add('commande_plats')
+            read = 0
+            
+            with db.engine.connect() as conn:
+                # Catalogue-sized: rereading them is cheaper than tracking their updates
+                for table, converters in (
+                    (db.categories, {'id': self._ids, 'nom': self._names}),
+                    (db.plats, {'id': self._ids, 'nom': self._names, 'prix': self._cents, 'categorie_id': self._ids}),
+                ):
+                    columns, count = self._read(
+                        conn, select(*(table.c[name] for name in converters)).order_by(table.c.id), converters
+                    )
+                    self._columns[table.name] = columns
+                    read += count
+                
+                # Parents before children, so every line read below belongs to a commande already read
+                read += self._read_appended(conn, db.clients, {'id': self._ids, 'nom': self._names},
+                                            'clients' in reload)
+                read += self._read_appended(conn, db.commandes, {
+                    'id': self._ids, 'client_id': self._ids, 'date_commande': self._dates, 'total': self._cents,
+                }, 'commandes' in reload)
+                read += self._read_appended(conn, db.avis, {
+                    'id': self._ids, 'plat_id': self._ids, 'note': self._ids, 'date_avis': self._dates,
+                }, 'avis' in reload)
+                
+                lignes = db.commande_plats
+                query = select(lignes.c.commande_id, lignes.c.plat_id, lignes.c.quantite).where(
+                    lignes.c.commande_id <= self._watermarks['commandes']
+                )
+                if 'commande_plats' not in reload:
+                    query = query.where(lignes.c.commande_id > self._watermarks['commande_plats'])
+                columns, count = self._read(conn, query.order_by(lignes.c.commande_id), {
+                    'commande_id': self._ids, 'plat_id': self._ids, 'quantite': self._ids,
+                })
+                commandes = self._columns['commandes']
+                columns['date_commande'] = commandes['date_commande'][
+                    self.np.searchsorted(commandes['id'], columns['commande_id'])
+                ]
+                self._append('commande_plats', columns, 'commande_plats' in reload)
+                self._watermarks['commande_plats'] = self._watermarks['commandes']
+                read += count
+                
+                missed = set()
+                if not reload and time.monotonic() - self.verified_at >= self.verify_every:
+                    missed = self._missed(conn)
+                    self.verified_at = time.monotonic()
+            
+            if missed:
+                logger.warning(f"Lignes validees sous le filigrane dans {', '.join(sorted(missed))}, rechargement")
+                self._reload = missed
+                return read + self.refresh()
+            
+            self._index()
+            self._reload.clear()
+            self._stale = False
+            self.refreshed_at = time.monotonic()
+            self.refreshes += 1
+            logger.info(f"Instantane analytique rafraichi: {read} lignes lues en {time.perf_counter() - start:.3f}s")
+            return read
+    
+    def _index(self):
+        # Dense group positions; recomputed every time because plats and categories are reread
+        np = self.np
+        columns = self._columns
+        self._plat_categorie = np.searchsorted(columns['categories']['id'], columns['plats']['categorie_id'])
+        self._ligne_plat = np.searchsorted(columns['plats']['id'], columns['commande_plats']['plat_id'])
+        self._avis_plat = np.searchsorted(columns['plats']['id'], columns['avis']['plat_id'])
+        self._commande_client = np.searchsorted(columns['clients']['id'], columns['commandes']['client_id'])
+    
+    def _periode(self, dates, debut, fin):
+        if debut is None and fin is None:
+            return slice(None)
+        np = self.np
+        return (dates >= np.datetime64(debut or PERIODE_MIN, 'us')) & (dates < np.datetime64(fin or PERIODE_MAX, 'us'))
+    
+    def _ranked(self, present, metric, ids):
+        # Same order as the SQL reports: metric descending, then id for ties
+        candidates = self.np.flatnonzero(present)
+        return candidates[self.np.lexsort((ids[candidates], -metric[candidates]))]
+    
+    def _group_sum(self, groups, values, size):
+        # A float64 bincount is exact for integer sums below 2**53 (about 90 000 billion in cents)
+        np = self.np
+        return np.rint(np.bincount(groups, weights=values, minlength=size)).astype(np.int64)
+    
+    def _top_plats(self, limit=None, debut=None, fin=None):
+        plats = self._columns['plats']
+        lignes = self._columns['commande_plats']
+        mask = self._periode(lignes['date_commande'], debut, fin)
+        groups = self._ligne_plat[mask]
+        totals = self._group_sum(groups, lignes['quantite'][mask], len(plats['id']))
+        present = self.np.bincount(groups, minlength=len(plats['id'])) > 0
+        order = self._ranked(present, totals, plats['id'])[:5 if limit is None else limit]
+        return tuple(TopPlat(plats['nom'][i], int(totals[i])) for i in order)
+    
+    def _ca_par_categorie(self, limit=None, debut=None, fin=None):
+        plats = self._columns['plats']
+        categories = self._columns['categories']
+        lignes = self._columns['commande_plats']
+        mask = self._periode(lignes['date_commande'], debut, fin)
+        ligne_plat = self._ligne_plat[mask]
+        groups = self._plat_categorie[ligne_plat]
+        ca = self._group_sum(groups, plats['prix'][ligne_plat] * lignes['quantite'][mask], len(categories['id']))
+        present = self.np.bincount(groups, minlength=len(categories['id'])) > 0
+        order = self._ranked(present, ca, categories['id'])[:limit]
+        return tuple(ChiffreAffairesCategorie(categories['nom'][i], Decimal(int(ca[i])).scaleb(-2)) for i in order)
+    
+    def _clients_fideles(self, limit=None, debut=None, fin=None):
+        clients = self._columns['clients']
+        commandes = self._columns['commandes']
+        mask = self._periode(commandes['date_commande'], debut, fin)
+        groups = self._commande_client[mask]
+        nb = self.np.bincount(groups, minlength=len(clients['id']))
+        total = self._group_sum(groups, commandes['total'][mask], len(clients['id']))
+        order = self._ranked(nb > 0, nb, clients['id'])[:limit]
+        return tuple(ClientFidele(clients['nom'][i], int(nb[i]), Decimal(int(total[i])).scaleb(-2)) for i in order)
+    
+    def _notes_moyennes(self, limit=None, debut=None, fin=None):
+        np = self.np
+        plats = self._columns['plats']
+        avis = self._columns['avis']
+        mask = self._periode(avis['date_avis'], debut, fin)
+        groups = self._avis_plat[mask]
+        nb = np.bincount(groups, minlength=len(plats['id']))
+        somme = np.bincount(groups, weights=avis['note'][mask], minlength=len(plats['id']))
+        moyenne = np.divide(somme, nb, out=np.zeros(len(nb)), where=nb > 0)
+        order = self._ranked(nb > 0, moyenne, plats['id'])[:limit]
+        return tuple(NotePlat(plats['nom'][i], float(moyenne[i]), int(nb[i])) for i in order)
+    
+    def report(self, name, limit=None, debut=None, fin=None):
+        """Rows of one ANALYTICS_REPORTS report, refreshing first when older than max_lag."""
+        with self._lock:
+            if self._stale or time.monotonic() - self.refreshed_at > self.max_lag:
+                self.refresh()
+            base = name[:-len('_periode')] if name.endswith('_periode') else name
+            return getattr(self, f"_{base}")(limit, debut, fin)
+
+
+# The recipe matrix only depends on these; ingredient costs and stock are reread on each call
+# because every order rewrites ingredients.stock
+RECIPE_TABLES = {'plats', 'plat_ingredients'}
+
+
+class RecipeMatrix:
+    """Sparse plat x ingredient quantity matrix (coordinate arrays) built once from plat_ingredients.
+    
+    Quantities are held in thousandths and prices in cents, so costs and demands
+    are exact integer products reduced with bincount.
+    """
+    
+    def __init__(self, conn, db):
+        try:
+            import numpy as np
+        except ImportError:
+            raise ImportError("Le moteur de recettes necessite numpy (pip install numpy)")
+        self.np = np
+        
+        plats = list(zip(*conn.execute(
+            select(db.plats.c.id, db.plats.c.nom, db.plats.c.prix).order_by(db.plats.c.id)
+        ).all())) or [(), (), ()]
+        self.plat_ids = np.fromiter(plats[0], dtype=np.int64, count=len(plats[0]))
+        self.plat_noms = np.array(plats[1], dtype=object)
+        self.prix = np.fromiter((int(prix * 100) for prix in plats[2]), dtype=np.int64, count=len(plats[2]))
+        
+        recettes = list(zip(*conn.execute(select(
+            db.plat_ingredients.c.plat_id,
+            db.plat_ingredients.c.ingredient_id,
+            db.plat_ingredients.c.quantite_necessaire
+        )).all())) or [(), (), ()]
+        self.recette_plat = np.searchsorted(self.plat_ids, np.fromiter(recettes[0], dtype=np.int64, count=len(recettes[0])))
+        self.recette_ingredient_ids = np.fromiter(recettes[1], dtype=np.int64, count=len(recettes[1]))
+        self.recette_quantite = np.fromiter(
+            (int(quantite * 1000) for quantite in recettes[2]), dtype=np.int64, count=len(recettes[2])
+        )
+        self.built_at = time.monotonic()
+    
+    def positions(self, plat_ids):
+        """Row of each plat id in the matrix, with a mask of the ids it actually holds."""
+        np = self.np
+        plat_ids = np.asarray(plat_ids, dtype=np.int64)
+        positions = np.searchsorted(self.plat_ids, plat_ids)
+        known = positions < len(self.plat_ids)
+        known[known] = self.plat_ids[positions[known]] == plat_ids[known]
+        return positions, known
+    
+    def costs(self, ingredients):
+        """Food cost of every plat in 1e-5 DH (thousandths of a unit times cents)."""
+        np = self.np
+        recette_ingredient = np.searchsorted(ingredients['id'], self.recette_ingredient_ids)
+        valeurs = self.recette_quantite * ingredients['cout_unitaire'][recette_ingredient]
+        # A float64 bincount is exact for integer sums below 2**53
+        return np.rint(np.bincount(self.recette_plat, weights=valeurs, minlength=len(self.plat_ids))).astype(np.int64)
+    
+    def demand(self, volumes, ingredients):
+        """Ingredient quantities in thousandths for volumes, an array of portions aligned on plat_ids."""
+        np = self.np
+        recette_ingredient = np.searchsorted(ingredients['id'], self.recette_ingredient_ids)
+        valeurs = self.recette_quantite * volumes[self.recette_plat]
+        return np.rint(np.bincount(recette_ingredient, weights=valeurs, minlength=len(ingredients['id']))).astype(np.int64)
+
+
+# Errors caused by the events themselves: the same batch would fail again on retry
+REJECTED_ERRORS = (ValueError, exc.IntegrityError, exc.DataError)
+
+
+class WriteBehindQueue:
+    """Background thread grouping submitted avis and orders into one transaction per batch.
+    
+    A batch is written once max_batch events are pending or the oldest has waited
+    max_delay seconds, and producers block while max_pending events are queued.
+    While the database is unreachable, batches are appended to spill_path as JSON
+    lines. The spill is retried every retry_delay seconds, even with no new traffic,
+    and always replayed before newer batches so orders keep their claim on stock;
+    without spill_path the events stay queued instead. Delivery is at-least-once if
+    the process dies during a replay. Events the database refuses (unknown plat,
+    insufficient stock) are appended with their error to dead_letter_path, by
+    default spill_path + '.rejets'.
+    """
+    
+    def __init__(self, db, max_batch=500, max_delay=0.05, max_pending=10000, spill_path=None,
+                 retry_delay=1.0, check_stock=True, dead_letter_path=None):
+        if dead_letter_path is None and spill_path is not None:
+            dead_letter_path = spill_path + '.rejets'
+        self.db = db
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.max_pending = max_pending
+        self.spill_path = spill_path
+        self.dead_letter_path = dead_letter_path
+        self.retry_delay = retry_delay
+        self.check_stock = check_stock
+        self._pending = deque()
+        self._cond = threading.Condition()
+        self._inflight = 0
+        self._flush_waiters = 0
+        self._closed = False
+        self._stalled = False
+        self._retry_at = 0.0
+        self._replay_asked = False
+        self._replay_attempts = 0
+        # Writes that failed to reach both the database and the spill, replays included
+        self._failed_attempts = 0
+        # Spilled events not yet written back, including those left by a previous run
+        self.backlog = 0
+        for path in ((spill_path + '.replay', spill_path) if spill_path is not None else ()):
+            if os.path.exists(path):
+                with open(path, encoding='utf-8') as f:
+                    self.backlog += sum(1 for line in f if line.strip())
+        self.started_at = time.monotonic()
+        self.submitted = 0
+        self.written = {'avis': 0, 'commande': 0}
+        self.commits = 0
+        self.rejected = 0
+        self.spilled = 0
+        self.replayed = 0
+        self.failures = 0
+        self.blocked = 0
+        self.blocked_seconds = 0.0
+        self.flush_seconds = 0.0
+        self.max_queued = 0
+        self._thread = threading.Thread(target=self._run, name='write-behind', daemon=True)
+        self._thread.start()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+    
+    def submit_avis(self, client_id, plat_id, note, commentaire=None, date_avis=None, timeout=None):
+        row = self.db._normalize_avis({
+            'client_id': client_id, 'plat_id': plat_id, 'note': note,
+            'commentaire': commentaire, 'date_avis': date_avis,
+        })
+        self._submit('avis', row, timeout)
+    
+    def submit_order(self, client_id, lignes, date_commande=None, timeout=None):
+        """Queue an order; its date defaults to now, not to when the batch is written."""
+        order = self.db._normalize_order({'client_id': client_id, 'lignes': lignes, 'date_commande': date_commande})
+        self._submit('commande', order, timeout)
+    
+    def _submit(self, kind, payload, timeout):
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("File d'ecriture differee fermee")
+            if len(self._pending) >= self.max_pending:
+                # Backpressure: the producer waits for the writer instead of growing the queue
+                start = time.monotonic()
+                self.blocked += 1
+                libre = self._cond.wait_for(lambda: len(self._pending) < self.max_pending or self._closed, timeout)
+                self.blocked_seconds += time.monotonic() - start
+                if self._closed:
+                    raise RuntimeError("File d'ecriture differee fermee")
+                if not libre:
+                    raise queue.Full(f"{len(self._pending)} evenements deja en attente d'ecriture")
+            self._pending.append((time.monotonic(), kind, payload))
+            self.submitted += 1
+            self.max_queued = max(self.max_queued, len(self._pending))
+            if len(self._pending) == 1 or len(self._pending) >= self.max_batch:
+                self._cond.notify_all()
+    
+    def _next_batch(self):
+        """Next batch and whether to retry the spill right away; an empty batch retries the spill alone."""
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                if self._pending:
+                    if self._closed or self._flush_waiters or len(self._pending) >= self.max_batch:
+                        due = now
+                    else:
+                        due = self._pending[0][0] + self.max_delay
+                    if self._stalled and not (self._closed or self._replay_asked):
+                        due = max(due, self._retry_at)
+                elif self.backlog and self._replay_asked:
+                    due = now
+                elif self._closed:
+                    return None
+                else:
+                    # Idle: wake up to retry the spill, otherwise sleep until an event arrives
+                    due = self._retry_at if self.backlog else None
+                if due is not None and due <= now:
+                    break
+                self._cond.wait(None if due is None else due - now)
+            force, self._replay_asked = self._replay_asked, False
+            batch = [self._pending.popleft() for _ in range(min(self.max_batch, len(self._pending)))]
+            self._inflight = len(batch)
+            self._cond.notify_all()
+            return batch, force
+    
+    def _run(self):
+        while True:
+            suivant = self._next_batch()
+            if suivant is None:
+                return
+            batch, force = suivant
+            # Spilled events are older than anything queued, so they are written first
+            if self.backlog:
+                self._replay_spill(force)
+            if not batch:
+                restes = []
+            elif self.backlog:
+                # Still unreachable: queue behind the spill rather than overtake it
+                restes = self._spill(batch)
+            else:
+                restes = self._flush(batch)
+            with self._cond:
+                self._inflight = 0
+                self._stalled = bool(restes)
+                # Nowhere to spill: keep the events at the head of the queue, oldest first
+                self._pending.extendleft(reversed(restes))
+                self._cond.notify_all()
+                if restes and self._closed:
+                    logger.error(f"{len(self._pending)} evenements non ecrits a la fermeture")
+                    return
+    
+    def _flush(self, batch, replay=False):
+        """Write one batch; return the events that could not be written nor spilled."""
+        avis = [payload for _, kind, payload in batch if kind == 'avis']
+        orders = [payload for _, kind, payload in batch if kind == 'commande']
+        start = time.perf_counter()
+        try:
+            self.db.write_events(avis, orders, self.check_stock)
+        except REJECTED_ERRORS as e:
+            if len(batch) > 1:
+                # One bad event must not sink the others: split until it is isolated
+                middle = len(batch) // 2
+                return self._flush(batch[:middle], replay) + self._flush(batch[middle:], replay)
+            self._reject(batch[0], e)
+            return []
+        except Exception as e:
+            with self._cond:
+                self.failures += 1
+                self._failed_attempts += 1
+                self._retry_at = time.monotonic() + self.retry_delay
+            logger.error(f"Base indisponible, {len(batch)} evenements differes: {e}")
+            if replay or self.spill_path is None:
+                return batch
+            return self._spill(batch)
+        
+        with self._cond:
+            self.commits += 1
+            self.written['avis'] += len(avis)
+            self.written['commande'] += len(orders)
+            self.flush_seconds += time.perf_counter() - start
+            if replay:
+                self.replayed += len(batch)
+        return []
+    
+    def _encode(self, kind, payload):
+        if kind == 'avis':
+            return {'type': kind, **payload}
+        client_id, date_commande, quantites = payload
+        return {'type': kind, 'client_id': client_id, 'date_commande': date_commande,
+                'lignes': sorted(quantites.items())}
+    
+    def _decode(self, line):
+        event = json.loads(line)
+        kind = event.pop('type')
+        if kind == 'avis':
+            event['date_avis'] = datetime.fromisoformat(event['date_avis'])
+            return (0.0, kind, event)
+        quantites = {plat_id: quantite for plat_id, quantite in event['lignes']}
+        return (0.0, kind, (event['client_id'], datetime.fromisoformat(event['date_commande']), quantites))
+    
+    def _write_spill(self, path, batch, mode):
+        with open(path, mode, encoding='utf-8') as f:
+            for _, kind, payload in batch:
+                f.write(json.dumps(self._encode(kind, payload), default=_export_value) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+    
+    def _reject(self, event, error):
+        with self._cond:
+            self.rejected += 1
+        _, kind, payload = event
+        ligne = json.dumps({'erreur': str(error), 'evenement': self._encode(kind, payload)}, default=_export_value)
+        if self.dead_letter_path is not None:
+            try:
+                with open(self.dead_letter_path, 'a', encoding='utf-8') as f:
+                    f.write(ligne + '\n')
+                    f.flush()
+                    os.fsync(f.fileno())
+                logger.warning(f"Evenement {kind} rejete, conserve dans {self.dead_letter_path}: {error}")
+                return
+            except OSError as e:
+                logger.error(f"Ecriture impossible dans {self.dead_letter_path}: {e}")
+        # Last resort: the log line carries the whole event so it can still be replayed by hand
+        logger.error(f"Evenement {kind} rejete: {ligne}")
+    
+    def _spill(self, batch):
+        try:
+            self._write_spill(self.spill_path, batch, 'a')
+        except OSError as e:
+            logger.error(f"Ecriture impossible dans {self.spill_path}: {e}")
+            with self._cond:
+                self._failed_attempts += 1
+                self._retry_at = time.monotonic() + self.retry_delay
+            return batch
+        with self._cond:
+            self.spilled += len(batch)
+            self.backlog += len(batch)
+        return []
+    
+    def _read_spill(self, path):
+        events = []
+        with open(path, encoding='utf-8') as f:
+            for numero, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    events.append(self._decode(line))
+                except (ValueError, KeyError) as e:
+                    # Typically the last line, cut short by a crash while spilling
+                    logger.warning(f"Ligne {numero} de {path} ignoree: {e}")
+        return events
+    
+    def _replay_spill(self, force=False):
+        """Write back spilled events in order, stopping at the first database failure."""
+        if not force and time.monotonic() < self._retry_at:
+            return
+        encours = self.spill_path + '.replay'
+        try:
+            while True:
+                if not os.path.exists(encours):
+                    if not os.path.exists(self.spill_path):
+                        with self._cond:
+                            self.backlog = 0
+                        return
+                    os.replace(self.spill_path, encours)
+                events = self._read_spill(encours)
+                for offset in range(0, len(events), self.max_batch):
+                    batch = events[offset:offset + self.max_batch]
+                    restes = self._flush(batch, replay=True)
+                    with self._cond:
+                        self.backlog -= len(batch) - len(restes)
+                    if restes:
+                        tmp = encours + '.tmp'
+                        self._write_spill(tmp, restes + events[offset + self.max_batch:], 'w')
+                        os.replace(tmp, encours)
+                        return
+                os.remove(encours)
+                logger.info(f"{len(events)} evenements differes rejoues depuis {self.spill_path}")
+        finally:
+            with self._cond:
+                self._replay_attempts += 1
+    
+    def _unwritten(self):
+        return len(self._pending) + self._inflight + self.backlog
+    
+    def flush(self, timeout=None):
+        """Wait until every event submitted so far is written or rejected, spilled ones included.
+        
+        Queued and spilled events are retried at once. Returns False, without waiting
+        for retry_delay, as soon as one of those writes fails, or once timeout expires.
+        """
+        with self._cond:
+            self._flush_waiters += 1
+            attempts = self._replay_attempts
+            failures = self._failed_attempts
+            self._replay_asked = True
+            self._cond.notify_all()
+            try:
+                self._cond.wait_for(lambda: not self._thread.is_alive() or not self._inflight and (
+                    self._failed_attempts > failures
+                    or not self._pending and (not self.backlog or self._replay_attempts > attempts)
+                ), timeout)
+                return not self._unwritten()
+            finally:
+                self._flush_waiters -= 1
+    
+    def close(self, timeout=None):
+        """Stop accepting events, write what is queued and return how many are left unwritten.
+        
+        Spilled events that could not be replayed count as unwritten; they stay in
+        spill_path for the next run.
+        """
+        with self._cond:
+            self._closed = True
+            self._replay_asked = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+        with self._cond:
+            return self._unwritten()
+    
+    def stats(self):
+        with self._cond:
+            written = sum(self.written.values())
+            elapsed = time.monotonic() - self.started_at
+            return {
+                'submitted': self.submitted,
+                'pending': len(self._pending) + self._inflight,
+                'max_queued': self.max_queued,
+                'written_avis': self.written['avis'],
+                'written_commandes': self.written['commande'],
+                'commits': self.commits,
+                'events_per_commit': written / self.commits if self.commits else 0.0,
+                'events_per_sec': written / elapsed if elapsed else 0.0,
+                'flush_ms_avg': self.flush_seconds * 1000 / self.commits if self.commits else 0.0,
+                'rejected': self.rejected,
+                'spilled': self.spilled,
+                'backlog': self.backlog,
+                'replayed': self.replayed,
+                'failures': self.failures,
+                'blocked': self.blocked,
+                'blocked_seconds': self.blocked_seconds,
+            }
+
+
+def _env_setting(name, value, cast, can_disable=False):
+    if value is not None:
+        return value
+    raw = os.getenv(name)
+    if raw is None or raw == '':
+        return None
+    if raw.lower() in ('off', 'none', 'false'):
+        if not can_disable:
+            raise ValueError(f"{name}={raw!r} invalide: une valeur numerique est attendue")
+        return -1
+    return cast(raw)
+
+
+def _pool_settings(connection_string, pool_size=None, max_overflow=None,
+                   pool_timeout=None, pool_recycle=None, pre_ping_idle=None):
+    """Resolve pool options from arguments, then DB_POOL_* environment variables, then defaults."""
+    settings = {
+        'pool_size': _env_setting('DB_POOL_SIZE', pool_size, int),
+        'max_overflow': _env_setting('DB_MAX_OVERFLOW', max_overflow, int),
+        'pool_timeout': _env_setting('DB_POOL_TIMEOUT', pool_timeout, float),
+        'pool_recycle': _env_setting('DB_POOL_RECYCLE', pool_recycle, int),
+    }
+    pre_ping_idle = _env_setting('DB_PRE_PING_IDLE', pre_ping_idle, float, can_disable=True)
+    
+    engine_kwargs = {'pool_recycle': 300 if settings['pool_recycle'] is None else settings['pool_recycle']}
+    url = make_url(connection_string)
+    # In-memory SQLite lives in a single connection and keeps SQLAlchemy's own pool
+    if not (url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:')):
+        engine_kwargs['poolclass'] = MeteredQueuePool
+        for name in ('pool_size', 'max_overflow', 'pool_timeout'):
+            if settings[name] is not None:
+                engine_kwargs[name] = settings[name]
+    
+    # 30s idle threshold by default; 0 pings on every checkout, a negative value disables it
+    if pre_ping_idle is None:
+        pre_ping_idle = 30.0
+    elif pre_ping_idle < 0:
+        pre_ping_idle = None
+    return engine_kwargs, pre_ping_idle
+
+
+def _row_hash(table, row, columns):
+    """Digest of the given columns, stable across drivers (Decimal scale, datetime precision)."""
+    values = []
+    for name in columns:
+        value = row[name]
+        column_type = table.c[name].type
+        if value is not None and isinstance(column_type, Numeric):
+            value = Decimal(str(value)).quantize(Decimal(1).scaleb(-(column_type.scale or 0)))
+        elif isinstance(value, datetime):
+            value = value.isoformat()
+        values.append(value)
+    return hashlib.blake2b(repr(values).encode('utf-8'), digest_size=16).digest()
+
+
+def _same_report_row(attendu, trouve):
+    if attendu is None or trouve is None:
+        return attendu is trouve
+    if len(attendu) != len(trouve):
+        return False
+    for a, t in zip(attendu, trouve):
+        # Averages come back as float or Decimal depending on the driver
+        if isinstance(a, float) or isinstance(t, float):
+            if not math.isclose(float(a), float(t), rel_tol=1e-9):
+                return False
+        elif a != t:
+            return False
+    return True
+
+
+def _dialect_insert(dialect):
+    # Imported on demand: the PostgreSQL dialect alone weighs tens of ms at import time
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    return dialect_insert
+
+
+_SCHEMAS = {}
+_SCHEMAS_LOCK = threading.Lock()
+
+
+def _month_start(moment):
+    return datetime(moment.year, moment.month, 1)
+
+
+def _add_months(moment, months):
+    index = moment.year * 12 + moment.month - 1 + months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+
+def _connect_args(connection_string):
+    if connection_string.startswith('postgresql'):
+        return {
+            "connect_timeout": 10,
+            "application_name": "restaurant_management_system"
+        }
+    return {}
+
+
+class RestaurantSchema:
+    """Table definitions and query builders shared by the sync and async databases."""
+    
+    partitioned = False
+    
+    def _bind_schema(self):
+        """Attach the module-wide tables for this layout, building them on first use only."""
+        with _SCHEMAS_LOCK:
+            schema = _SCHEMAS.get(self.partitioned)
+            if schema is None:
+                builder = RestaurantSchema()
+                builder.partitioned = self.partitioned
+                builder.metadata = MetaData()
+                builder.define_tables()
+                schema = _SCHEMAS[self.partitioned] = {
+                    'metadata': builder.metadata,
+                    'queries': {},
                 }
+        self.metadata = schema['metadata']
+        self._queries = schema['queries']
+        for name, table in self.metadata.tables.items():
+            setattr(self, name, table)
+    
+    def _periode(self, debut, fin):
+        return {'debut': debut or PERIODE_MIN, 'fin': fin or PERIODE_MAX}
+    
+    def _partition_options(self, table_name):
+        if not self.partitioned:
+            return {}
+        return {'postgresql_partition_by': f'RANGE ({PARTITIONED_TABLES[table_name]})'}
+    
+    def define_tables(self):
+        self.categories = Table('categories', self.metadata,
+            Column('id', Integer, primary_key=True),
+            Column('nom', String(50), nullable=False)
+        )
+        
+        self.fournisseurs = Table('fournisseurs', self.metadata,
+            Column('id', Integer, primary_key=True),
+            Column('nom', String(100), nullable=False),
+            Column('contact', String(100), nullable=False)
+        )
+        
+        self.plats = Table('plats', self.metadata,
+            Column('id', Integer, primary_key=True),
+            Column('nom', String(100), nullable=False),
+            Column('prix', Numeric(10, 2), nullable=False),
+            Column('description', String(255)),
+            Column('categorie_id', Integer, ForeignKey('categories.id'), nullable=False),
+            Index('ix_plats_categorie_id_prix', 'categorie_id', 'prix')
+        )
+        
+        self.clients = Table('clients', self.metadata,
+            Column('id', Integer, primary_key=True),
+            Column('nom', String(100), nullable=False),
+            Column('email', String(100), nullable=False, unique=True),
+            Column('telephone', String(20), nullable=True),
+            Index('ix_clients_nom', 'nom')
+        )
+        
+        # A partitioned table needs its partition key in the primary key
+        self.commandes = Table('commandes', self.metadata,
+            Column('id', Integer, primary_key=True, autoincrement=True),
+            Column('client_id', Integer, ForeignKey('clients.id'), nullable=False),
+            Column('date_commande', DateTime, nullable=False, primary_key=self.partitioned),
+            Column('total', Numeric(10, 2), nullable=False),
+            # client_id first: serves the FK join and the per-client history sorted by date;
+            # total is carried along so the loyalty aggregation never touches the table
+            Index('ix_commandes_client_id_date', 'client_id', 'date_commande', 'total'),
+            # date first for period filters, total included so revenue sums stay index-only
+            Index('ix_commandes_date_total', 'date_commande', 'total'),
+            **self._partition_options('commandes')
+        )
+        
+        self.ingredients = Table('ingredients', self.metadata,
+            Column('id', Integer, primary_key=True),
+            Column('nom', String(100), nullable=False),
+            Column('cout_unitaire', Numeric(10, 2), nullable=False),
+            Column('stock', Numeric(10, 3), nullable=False),
+            Column('fournisseur_id', Integer, ForeignKey('fournisseurs.id'), nullable=False),
+            Index('ix_ingredients_fournisseur_id', 'fournisseur_id')
+        )
+        
+        commande_plats_columns = [
+            Column('commande_id', Integer, primary_key=True),
+            Column('plat_id', Integer, ForeignKey('plats.id'), primary_key=True),
+            Column('quantite', Integer, nullable=False, default=1),
+            # Covering index for the per-dish SUM(quantite) aggregations
+            Index('ix_commande_plats_plat_id_quantite', 'plat_id', 'quantite')
+        ]
+        if self.partitioned:
+            # Lines carry their order date so they share the monthly layout of commandes
+            commande_plats_columns += [
+                Column('date_commande', DateTime, primary_key=True),
+                ForeignKeyConstraint(['commande_id', 'date_commande'], ['commandes.id', 'commandes.date_commande'])
+            ]
+        else:
+            commande_plats_columns.append(ForeignKeyConstraint(['commande_id'], ['commandes.id']))
+        self.commande_plats = Table('commande_plats', self.metadata,
+            *commande_plats_columns,
+            **self._partition_options('commande_plats')
+        )
+        
+        self.plat_ingredients = Table('plat_ingredients', self.metadata,
+            Column('plat_id', Integer, ForeignKey('plats.id'), primary_key=True),
+            Column('ingredient_id', Integer, ForeignKey('ingredients.id'), primary_key=True),
+            Column('quantite_necessaire', Numeric(10, 3), nullable=False),
+            Index('ix_plat_ingredients_ingredient_id', 'ingredient_id')
+        )
+        
+        self.avis = Table('avis', self.metadata,
+            Column('id', Integer, primary_key=True, autoincrement=True),
+            Column('client_id', Integer, ForeignKey('clients.id'), nullable=False),
+            Column('plat_id', Integer, ForeignKey('plats.id'), nullable=False),
+            Column('note', Integer, nullable=False),
+            Column('commentaire', Text, nullable=True),
+            Column('date_avis', DateTime, nullable=False, primary_key=self.partitioned),
+            Index('ix_avis_client_id', 'client_id'),
+            # Covering index for AVG(note) per dish
+            Index('ix_avis_plat_id_note', 'plat_id', 'note'),
+            Index('ix_avis_date_avis', 'date_avis'),
+            **self._partition_options('avis')
+        )
+        
+        self.define_summary_tables()
+        self.define_search()
+    
+    def _search_document(self, table):
+        # Must stay identical to the indexed expression for PostgreSQL to use the indexes
+        vide = text("''")
+        document = None
+        for name in SEARCH_FIELDS[table.name]:
+            field = func.coalesce(table.c[name], vide, type_=String)
+            document = field if document is None else document.concat(text("' '")).concat(field)
+        return document
+    
+    def define_search(self):
+        """tsvector + trigram GIN indexes on PostgreSQL, FTS5 tables kept in sync by triggers on SQLite."""
+        event.listen(
+            self.metadata, 'before_create',
+            DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect='postgresql')
+        )
+        for table_name, fields in SEARCH_FIELDS.items():
+            table = self.metadata.tables[table_name]
+            document = self._search_document(table)
+            Index(
+                f'ix_{table_name}_recherche_tsv', func.to_tsvector(text("'simple'"), document),
+                postgresql_using='gin'
+            ).ddl_if(dialect='postgresql')
+            Index(
+                f'ix_{table_name}_recherche_trgm', document.label('document'),
+                postgresql_using='gin', postgresql_ops={'document': 'gin_trgm_ops'}
+            ).ddl_if(dialect='postgresql')
+            
+            for statement in self._fts_ddl(table_name, fields):
+                event.listen(table, 'after_create', DDL(statement).execute_if(dialect='sqlite'))
+            event.listen(
+                table, 'before_drop',
+                DDL(f"DROP TABLE IF EXISTS {table_name}_recherche").execute_if(dialect='sqlite')
+            )
+    
+    def _fts_ddl(self, table_name, fields):
+        fts = f"{table_name}_recherche"
+        columns = ', '.join(fields)
+        new = ', '.join(f"new.{name}" for name in fields)
+        old = ', '.join(f"old.{name}" for name in fields)
+        return [
+            # External content: the index stores no copy of the text, only the tokens. The
+            # prefix indexes keep type-ahead fast up to twelve letters (a whole e-mail login);
+            # a longer prefix scans every matching token's postings
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({columns}, content='{table_name}', "
+            f"content_rowid='id', tokenize='unicode61 remove_diacritics 2', "
+            f"prefix='2 3 4 5 6 7 8 9 10 11 12')",
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table_name} BEGIN "
+            f"INSERT INTO {fts}(rowid, {columns}) VALUES (new.id, {new}); END",
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table_name} BEGIN "
+            f"INSERT INTO {fts}({fts}, rowid, {columns}) VALUES ('delete', old.id, {old}); END",
+            f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {columns} ON {table_name} BEGIN "
+            f"INSERT INTO {fts}({fts}, rowid, {columns}) VALUES ('delete', old.id, {old}); "
+            f"INSERT INTO {fts}(rowid, {columns}) VALUES (new.id, {new}); END",
+        ]
+    
+    def define_summary_tables(self):
+        # Report aggregates, kept in step with the raw tables by the class write path
+        self.stats_plats = Table('stats_plats', self.metadata,
+            Column('plat_id', Integer, ForeignKey('plats.id'), primary_key=True),
+            Column('total_commande', Integer, nullable=False, default=0),
+            Column('chiffre_affaires', Numeric(14, 2), nullable=False, default=0),
+            Column('nb_avis', Integer, nullable=False, default=0),
+            Column('somme_notes', Integer, nullable=False, default=0),
+            Index('ix_stats_plats_total_commande', 'total_commande'),
+            Index('ix_stats_plats_nb_avis_somme_notes', 'nb_avis', 'somme_notes')
+        )
+        
+        self.stats_categories = Table('stats_categories', self.metadata,
+            Column('categorie_id', Integer, ForeignKey('categories.id'), primary_key=True),
+            Column('chiffre_affaires', Numeric(14, 2), nullable=False, default=0),
+            Index('ix_stats_categories_chiffre_affaires', 'chiffre_affaires')
+        )
+        
+        self.stats_clients = Table('stats_clients', self.metadata,
+            Column('client_id', Integer, ForeignKey('clients.id'), primary_key=True),
+            Column('nb_commandes', Integer, nullable=False, default=0),
+            Column('total_depense', Numeric(14, 2), nullable=False, default=0),
+            Index('ix_stats_clients_nb_commandes', 'nb_commandes')
+        )
+    
+    def sample_data(self):
+        data = {
+            'categories': [
+                {'id': 1, 'nom': 'Entrée'},
+                {'id': 2, 'nom': 'Plat principal'},
+                {'id': 3, 'nom': 'Dessert'},
+                {'id': 4, 'nom': 'Boisson'},
+                {'id': 5, 'nom': 'Végétarien'}
+            ],
+            'fournisseurs': [
+                {'id': 1, 'nom': 'AgriFresh', 'contact': 'contact@agrifresh.com'},
+                {'id': 2, 'nom': 'MeatSupplier', 'contact': 'info@meatsupplier.com'},
+                {'id': 3, 'nom': 'BevCo', 'contact': 'sales@bevco.com'},
+                {'id': 4, 'nom': 'DairyFarm', 'contact': 'dairy@farm.com'}
+            ],
+            'plats': [
+                {'id': 1, 'nom': 'Salade César', 'prix': 45.00, 'description': 'Salade avec poulet grillé', 'categorie_id': 1},
+                {'id': 2, 'nom': 'Soupe de légumes', 'prix': 30.00, 'description': 'Soupe chaude de saison', 'categorie_id': 1},
+                {'id': 3, 'nom': 'Steak frites', 'prix': 90.00, 'description': 'Viande grillée et frites', 'categorie_id': 2},
+                {'id': 4, 'nom': 'Pizza Margherita', 'prix': 70.00, 'description': 'Pizza tomate & mozzarella', 'categorie_id': 2},
+                {'id': 5, 'nom': 'Tiramisu', 'prix': 35.00, 'description': 'Dessert italien', 'categorie_id': 3},
+                {'id': 6, 'nom': 'Glace 2 boules', 'prix': 25.00, 'description': 'Glace au choix', 'categorie_id': 3},
+                {'id': 7, 'nom': 'Coca-Cola', 'prix': 15.00, 'description': 'Boisson gazeuse', 'categorie_id': 4},
+                {'id': 8, 'nom': 'Eau minérale', 'prix': 10.00, 'description': 'Eau plate ou gazeuse', 'categorie_id': 4},
+                {'id': 9, 'nom': 'Curry de légumes', 'prix': 65.00, 'description': 'Plat végétarien épicé', 'categorie_id': 5},
+                {'id': 10, 'nom': 'Falafel wrap', 'prix': 50.00, 'description': 'Wrap avec falafels et légumes', 'categorie_id': 5}
+            ],
+            'clients': [
+                {'id': 1, 'nom': 'Amine Lahmidi', 'email': 'amine@example.com', 'telephone': '+212600123456'},
+                {'id': 2, 'nom': 'Sara Benali', 'email': 'sara.b@example.com', 'telephone': '+212600654321'},
+                {'id': 3, 'nom': 'Youssef El Khalfi', 'email': 'youssef.k@example.com', 'telephone': None},
+                {'id': 4, 'nom': 'Fatima Zahra', 'email': 'fatima.z@example.com', 'telephone': '+212600987654'},
+                {'id': 5, 'nom': 'Omar Alaoui', 'email': 'omar.a@example.com', 'telephone': '+212600112233'}
+            ],
+            'ingredients': [
+                {'id': 1, 'nom': 'Poulet', 'cout_unitaire': 15.00, 'stock': 50, 'fournisseur_id': 2},
+                {'id': 2, 'nom': 'Laitue', 'cout_unitaire': 5.00, 'stock': 20, 'fournisseur_id': 1},
+                {'id': 3, 'nom': 'Tomate', 'cout_unitaire': 3.00, 'stock': 30, 'fournisseur_id': 1},
+                {'id': 4, 'nom': 'Mozzarella', 'cout_unitaire': 10.00, 'stock': 15, 'fournisseur_id': 4},
+                {'id': 5, 'nom': 'Pomme de terre', 'cout_unitaire': 2.00, 'stock': 100, 'fournisseur_id': 1},
+                {'id': 6, 'nom': 'Café', 'cout_unitaire': 20.00, 'stock': 5, 'fournisseur_id': 3},
+                {'id': 7, 'nom': 'Sucre', 'cout_unitaire': 1.50, 'stock': 25, 'fournisseur_id': 3},
+                {'id': 8, 'nom': 'Pois chiches', 'cout_unitaire': 4.00, 'stock': 40, 'fournisseur_id': 1}
+            ],
+            'commandes': [
+                {'id': 1, 'client_id': 1, 'date_commande': datetime(2025, 7, 7, 12, 30), 'total': 120.00},
+                {'id': 2, 'client_id': 2, 'date_commande': datetime(2025, 7, 7, 13, 0), 'total': 85.00},
+                {'id': 3, 'client_id': 1, 'date_commande': datetime(2025, 7, 8, 19, 45), 'total': 150.00},
+                {'id': 4, 'client_id': 3, 'date_commande': datetime(2025, 8, 15, 18, 30), 'total': 200.00},
+                {'id': 5, 'client_id': 4, 'date_commande': datetime(2025, 9, 1, 20, 0), 'total': 95.00},
+                {'id': 6, 'client_id': 5, 'date_commande': datetime(2025, 9, 10, 12, 15), 'total': 75.00}
+            ],
+            'commande_plats': [
+                {'commande_id': 1, 'plat_id': 1, 'quantite': 1},
+                {'commande_id': 1, 'plat_id': 3, 'quantite': 1},
+                {'commande_id': 1, 'plat_id': 7, 'quantite': 2},
+                {'commande_id': 2, 'plat_id': 2, 'quantite': 1},
+                {'commande_id': 2, 'plat_id': 4, 'quantite': 1},
+                {'commande_id': 2, 'plat_id': 8, 'quantite': 1},
+                {'commande_id': 3, 'plat_id': 3, 'quantite': 1},
+                {'commande_id': 3, 'plat_id': 5, 'quantite': 1},
+                {'commande_id': 3, 'plat_id': 7, 'quantite': 1},
+                {'commande_id': 4, 'plat_id': 4, 'quantite': 2},
+                {'commande_id': 4, 'plat_id': 9, 'quantite': 1},
+                {'commande_id': 5, 'plat_id': 10, 'quantite': 1},
+                {'commande_id': 5, 'plat_id': 8, 'quantite': 2},
+                {'commande_id': 6, 'plat_id': 7, 'quantite': 3},
+                {'commande_id': 6, 'plat_id': 6, 'quantite': 1}
+            ],
+            'plat_ingredients': [
+                {'plat_id': 1, 'ingredient_id': 1, 'quantite_necessaire': 0.2},
+                {'plat_id': 1, 'ingredient_id': 2, 'quantite_necessaire': 0.1},
+                {'plat_id': 2, 'ingredient_id': 2, 'quantite_necessaire': 0.05},
+                {'plat_id': 2, 'ingredient_id': 5, 'quantite_necessaire': 0.1},
+                {'plat_id': 3, 'ingredient_id': 1, 'quantite_necessaire': 0.3},
+                {'plat_id': 3, 'ingredient_id': 5, 'quantite_necessaire': 0.2},
+                {'plat_id': 4, 'ingredient_id': 3, 'quantite_necessaire': 0.1},
+                {'plat_id': 4, 'ingredient_id': 4, 'quantite_necessaire': 0.15},
+                {'plat_id': 5, 'ingredient_id': 6, 'quantite_necessaire': 0.05},
+                {'plat_id': 5, 'ingredient_id': 7, 'quantite_necessaire': 0.02},
+                {'plat_id': 9, 'ingredient_id': 8, 'quantite_necessaire': 0.1},
+                {'plat_id': 10, 'ingredient_id': 8, 'quantite_necessaire': 0.15}
+            ],
+            'avis': [
+                {'id': 1, 'client_id': 1, 'plat_id': 1, 'note': 4, 'commentaire': 'Très frais, poulet bien cuit', 'date_avis': datetime(2025, 7, 7, 13, 0)},
+                {'id': 2, 'client_id': 2, 'plat_id': 4, 'note': 5, 'commentaire': 'Meilleure pizza du coin !', 'date_avis': datetime(2025, 7, 7, 14, 0)},
+                {'id': 3, 'client_id': 3, 'plat_id': 9, 'note': 3, 'commentaire': 'Un peu trop épicé', 'date_avis': datetime(2025, 8, 15, 19, 0)},
+                {'id': 4, 'client_id': 4, 'plat_id': 10, 'note': 4, 'commentaire': 'Bon, mais manque de sauce', 'date_avis': datetime(2025, 9, 1, 21, 0)},
+                {'id': 5, 'client_id': 5, 'plat_id': 6, 'note': 5, 'commentaire': 'Glace délicieuse', 'date_avis': datetime(2025, 9, 10, 13, 0)}
+            ]
+        }
+        if self.partitioned:
+            dates = {row['id']: row['date_commande'] for row in data['commandes']}
+            for row in data['commande_plats']:
+                row['date_commande'] = dates[row['commande_id']]
+        return data
+    
+    def _increment(self, conn, table, rows):
+        if not rows:
+            return
+        keys = [column.name for column in table.primary_key.columns]
+        counters = [name for name in rows[0] if name not in keys]
+        dialect = conn.dialect.name
+        
+        if dialect in ('postgresql', 'sqlite'):
+            dialect_insert = _dialect_insert(dialect)
+            stmt = dialect_insert(table)
+            stmt = stmt.on_conflict_do_update(
+                index_elements=keys,
+                set_={name: table.c[name] + stmt.excluded[name] for name in counters}
+            )
+            conn.execute(stmt, rows)
+            return
+        
+        for row in rows:
+            where = [table.c[key] == row[key] for key in keys]
+            updated = conn.execute(
+                table.update().where(*where).values(
+                    {name: table.c[name] + row[name] for name in counters}
+                )
+            )
+            if updated.rowcount == 0:
+                conn.execute(insert(table), row)
+    
+    def _reset_sequence(self, conn, table):
+        pk = [column for column in table.primary_key.columns if isinstance(column.type, Integer)]
+        # Join tables have no sequence; partitioned tables keep a serial id next to the date key
+        if len(pk) == 1 and (len(table.primary_key.columns) == 1 or pk[0].autoincrement is True):
+            conn.exec_driver_sql(
+                f"SELECT setval(pg_get_serial_sequence('{table.name}', '{pk[0].name}'), "
+                f"COALESCE(MAX({pk[0].name}), 1)) FROM {table.name}"
+            )
+    
+    def _sync_table(self, conn, table, rows, key=None, summaries=None):
+        """Upsert one batch of rows keyed on key (primary key by default), skipping unchanged ones.
+        
+        Rows are compared with what is stored through a hash of the columns they
+        carry, so a batch identical to the database issues a single SELECT. When the
+        key is a natural key (SYNC_KEYS), the feed's primary key is neither compared
+        nor inserted: the database keeps or assigns its own. With a summaries dict, inserted orders and avis are applied to the summary tables as
+        deltas and summaries['rebuild'] is set when a change needs a full rebuild.
+        """
+        counts = {'inserted': 0, 'updated': 0, 'unchanged': 0}
+        if not rows:
+            return counts
+        key = list(key or SYNC_KEYS.get(table.name) or table.primary_key.columns.keys())
+        columns = [name for name in table.columns.keys() if name in rows[0]]
+        missing = [name for name in key if name not in columns]
+        if missing:
+            raise ValueError(f"Colonnes de cle absentes pour {table.name}: {', '.join(missing)}")
+        
+        # Never rewrite a primary key matched through a natural key: other tables reference it
+        updatable = [name for name in columns if name not in key and not table.c[name].primary_key]
+        compared = key + updatable
+        
+        # Last occurrence wins when a feed repeats a key inside one batch
+        incoming = {tuple(row[name] for name in key): row for row in rows}
+        key_columns = [table.c[name] for name in key]
+        where = (key_columns[0].in_([k[0] for k in incoming]) if len(key) == 1
+                 else tuple_(*key_columns).in_(list(incoming)))
+        summary_columns = [name for name in SUMMARY_COLUMNS.get(table.name, ()) if name in columns]
+        stored = {
+            tuple(row._mapping[name] for name in key):
+            (_row_hash(table, row._mapping, compared), _row_hash(table, row._mapping, summary_columns))
+            for row in conn.execute(select(*(table.c[name] for name in compared)).where(where))
+        }
+        
+        new_rows, changed_rows = [], []
+        summary_changed = False
+        for row_key, row in incoming.items():
+            if row_key not in stored:
+                new_rows.append(row)
+            elif stored[row_key][0] != _row_hash(table, row, compared):
+                changed_rows.append(row)
+                summary_changed = summary_changed or stored[row_key][1] != _row_hash(table, row, summary_columns)
+            else:
+                counts['unchanged'] += 1
+        counts['inserted'] = len(new_rows)
+        counts['updated'] = len(changed_rows)
+        if not new_rows and not changed_rows:
+            return counts
+        
+        written = new_rows + changed_rows
+        if len(compared) < len(columns):
+            written = [{name: row[name] for name in compared} for row in written]
+            new_rows = written[:len(new_rows)]
+        dialect = conn.dialect.name
+        if dialect in ('postgresql', 'sqlite'):
+            dialect_insert = _dialect_insert(dialect)
+            stmt = dialect_insert(table)
+            if updatable:
+                stmt = stmt.on_conflict_do_update(
+                    index_elements=key,
+                    set_={name: stmt.excluded[name] for name in updatable}
+                )
+            else:
+                stmt = stmt.on_conflict_do_nothing(index_elements=key)
+            conn.execute(stmt, written)
+        else:
+            if new_rows:
+                conn.execute(insert(table), new_rows)
+            for row in changed_rows:
+                conn.execute(
+                    table.update()
+                    .where(*(table.c[name] == row[name] for name in key))
+                    .values({name: row[name] for name in updatable})
+                )
+        if new_rows and dialect == 'postgresql':
+            self._reset_sequence(conn, table)
+        
+        if summaries is not None and table.name in SUMMARY_COLUMNS:
+            # A new plat has no sales yet; new orders and avis only add to the counters
+            incomplete = len(summary_columns) < len(SUMMARY_COLUMNS[table.name])
+            if summary_changed or (new_rows and table.name != 'plats' and incomplete):
+                summaries['rebuild'] = True
+            elif new_rows and table.name != 'plats' and not summaries['rebuild']:
+                self._update_summaries(conn, **{table.name: new_rows})
+                summaries['updated'] = True
+        return counts
+    
+    def _rebuild_summaries(self, conn):
+        for table, source in self._summary_sources().items():
+            conn.execute(delete(table))
+            conn.execute(table.insert().from_select(
+                [column.name for column in table.columns], source
+            ))
+    
+    def _update_summaries(self, conn, commandes=(), commande_plats=(), avis=()):
+        """Apply the deltas of freshly inserted raw rows to the summary tables.
+        
+        Counters are locked table by table in key order; callers make this the last
+        write of their transaction so every writer takes the summary locks the same way.
+        """
+        plats = defaultdict(lambda: {
+            'total_commande': 0, 'chiffre_affaires': Decimal(0), 'nb_avis': 0, 'somme_notes': 0
+        })
+        categories = defaultdict(Decimal)
+        clients = defaultdict(lambda: {'nb_commandes': 0, 'total_depense': Decimal(0)})
+        
+        for row in commandes:
+            client = clients[row['client_id']]
+            client['nb_commandes'] += 1
+            client['total_depense'] += Decimal(str(row['total']))
+        
+        quantites = defaultdict(int)
+        for row in commande_plats:
+            quantites[row['plat_id']] += row.get('quantite', 1)
+        if quantites:
+            prix = conn.execute(
+                select(self.plats.c.id, self.plats.c.prix, self.plats.c.categorie_id)
+                .where(self.plats.c.id.in_(list(quantites)))
+            )
+            for plat_id, prix_plat, categorie_id in prix:
+                montant = Decimal(str(prix_plat)) * quantites[plat_id]
+                plats[plat_id]['total_commande'] += quantites[plat_id]
+                plats[plat_id]['chiffre_affaires'] += montant
+                categories[categorie_id] += montant
+        
+        for row in avis:
+            plats[row['plat_id']]['nb_avis'] += 1
+            plats[row['plat_id']]['somme_notes'] += row['note']
+        
+        self._increment(conn, self.stats_plats, [
+            {'plat_id': plat_id, **deltas} for plat_id, deltas in sorted(plats.items())
+        ])
+        self._increment(conn, self.stats_categories, [
+            {'categorie_id': categorie_id, 'chiffre_affaires': montant}
+            for categorie_id, montant in sorted(categories.items())
+        ])
+        self._increment(conn, self.stats_clients, [
+            {'client_id': client_id, **deltas} for client_id, deltas in sorted(clients.items())
+        ])
+    
+    def _summary_sources(self):
+        """Aggregate the raw tables into the exact shape of each summary table."""
+        lignes = select(
+            self.commande_plats.c.plat_id,
+            func.sum(self.commande_plats.c.quantite).label('total_commande'),
+            func.sum(self.plats.c.prix * self.commande_plats.c.quantite).label('chiffre_affaires')
+        ).select_from(
+            self.commande_plats.join(self.plats)
+        ).group_by(self.commande_plats.c.plat_id).subquery()
+        
+        notes = select(
+            self.avis.c.plat_id,
+            func.count(self.avis.c.id).label('nb_avis'),
+            func.sum(self.avis.c.note).label('somme_notes')
+        ).group_by(self.avis.c.plat_id).subquery()
+        
+        stats_plats = select(
+            self.plats.c.id.label('plat_id'),
+            func.coalesce(lignes.c.total_commande, 0).label('total_commande'),
+            func.coalesce(lignes.c.chiffre_affaires, 0).label('chiffre_affaires'),
+            func.coalesce(notes.c.nb_avis, 0).label('nb_avis'),
+            func.coalesce(notes.c.somme_notes, 0).label('somme_notes')
+        ).select_from(
+            self.plats
+            .outerjoin(lignes, lignes.c.plat_id == self.plats.c.id)
+            .outerjoin(notes, notes.c.plat_id == self.plats.c.id)
+        ).where(
+            (lignes.c.plat_id.isnot(None)) | (notes.c.plat_id.isnot(None))
+        )
+        
+        stats_categories = select(
+            self.plats.c.categorie_id,
+            func.sum(self.plats.c.prix * self.commande_plats.c.quantite).label('chiffre_affaires')
+        ).select_from(
+            self.plats.join(self.commande_plats)
+        ).group_by(self.plats.c.categorie_id)
+        
+        stats_clients = select(
+            self.commandes.c.client_id,
+            func.count(self.commandes.c.id).label('nb_commandes'),
+            func.sum(self.commandes.c.total).label('total_depense')
+        ).group_by(self.commandes.c.client_id)
+        
+        return {
+            self.stats_plats: stats_plats,
+            self.stats_categories: stats_categories,
+            self.stats_clients: stats_clients,
+        }
+    
+    def period_queries(self):
+        """Date-bounded report variants; on partitioned tables the bounds prune partitions."""
+        debut = bindparam('debut', type_=DateTime)
+        fin = bindparam('fin', type_=DateTime)
+        queries = {}
+        
+        if self.partitioned:
+            lignes = self.commande_plats
+            lignes_periode = (self.commande_plats.c.date_commande >= debut) & (self.commande_plats.c.date_commande < fin)
+        else:
+            lignes = self.commande_plats.join(self.commandes)
+            lignes_periode = (self.commandes.c.date_commande >= debut) & (self.commandes.c.date_commande < fin)
+        
+        queries['top_plats_periode'] = select(
+            self.plats.c.nom.label('plat'),
+            func.sum(self.commande_plats.c.quantite).label('total_commande')
+        ).select_from(
+            lignes.join(self.plats)
+        ).where(lignes_periode).group_by(
+            self.plats.c.id, self.plats.c.nom
+        ).order_by(
+            func.sum(self.commande_plats.c.quantite).desc(), self.plats.c.id
+        ).limit(5)
+        
+        queries['ca_par_categorie_periode'] = select(
+            self.categories.c.nom.label('categorie'),
+            func.sum(self.plats.c.prix * self.commande_plats.c.quantite).label('ca')
+        ).select_from(
+            lignes.join(self.plats).join(self.categories)
+        ).where(lignes_periode).group_by(
+            self.categories.c.id, self.categories.c.nom
+        ).order_by(
+            func.sum(self.plats.c.prix * self.commande_plats.c.quantite).desc(), self.categories.c.id
+        )
+        
+        queries['clients_fideles_periode'] = select(
+            self.clients.c.nom.label('client'),
+            func.count(self.commandes.c.id).label('nb_commandes'),
+            func.sum(self.commandes.c.total).label('total_depense')
+        ).select_from(
+            self.clients.join(self.commandes)
+        ).where(
+            (self.commandes.c.date_commande >= debut) & (self.commandes.c.date_commande < fin)
+        ).group_by(
+            self.clients.c.id, self.clients.c.nom
+        ).order_by(
+            func.count(self.commandes.c.id).desc(), self.clients.c.id
+        )
+        
+        queries['notes_moyennes_periode'] = select(
+            self.plats.c.nom.label('plat'),
+            func.avg(self.avis.c.note).label('note_moyenne'),
+            func.count(self.avis.c.id).label('nb_avis')
+        ).select_from(
+            self.plats.join(self.avis)
+        ).where(
+            (self.avis.c.date_avis >= debut) & (self.avis.c.date_avis < fin)
+        ).group_by(
+            self.plats.c.id, self.plats.c.nom
+        ).order_by(
+            func.avg(self.avis.c.note).desc(), self.plats.c.id
+        )
+        
+        return queries
+    
+    def _summary_queries(self):
+        queries = {}
+        
+        queries['top_plats'] = select(
+            self.plats.c.nom.label('plat'),
+            self.stats_plats.c.total_commande
+        ).select_from(
+            self.stats_plats.join(self.plats)
+        ).where(
+            self.stats_plats.c.total_commande > 0
+        ).order_by(
+            self.stats_plats.c.total_commande.desc(), self.stats_plats.c.plat_id
+        ).limit(5)
+        
+        queries['ca_par_categorie'] = select(
+            self.categories.c.nom.label('categorie'),
+            self.stats_categories.c.chiffre_affaires.label('ca')
+        ).select_from(
+            self.stats_categories.join(self.categories)
+        ).order_by(
+            self.stats_categories.c.chiffre_affaires.desc(), self.stats_categories.c.categorie_id
+        )
+        
+        queries['clients_fideles'] = select(
+            self.clients.c.nom.label('client'),
+            self.stats_clients.c.nb_commandes,
+            self.stats_clients.c.total_depense
+        ).select_from(
+            self.stats_clients.join(self.clients)
+        ).order_by(
+            self.stats_clients.c.nb_commandes.desc(), self.stats_clients.c.client_id
+        )
+        
+        queries['notes_moyennes'] = select(
+            self.plats.c.nom.label('plat'),
+            (self.stats_plats.c.somme_notes * 1.0 / self.stats_plats.c.nb_avis).label('note_moyenne'),
+            self.stats_plats.c.nb_avis
+        ).select_from(
+            self.stats_plats.join(self.plats)
+        ).where(
+            self.stats_plats.c.nb_avis > 0
+        ).order_by(
+            (self.stats_plats.c.somme_notes * 1.0 / self.stats_plats.c.nb_avis).desc(), self.stats_plats.c.plat_id
+        )
+        
+        return queries
+    
+    def sample_queries(self, summaries=None):
+        queries = {}
+        
+        queries['plats_par_categorie'] = select(
+            self.plats.c.nom.label('plat'),
+            self.plats.c.prix,
+            self.categories.c.nom.label('categorie')
+        ).select_from(
+            self.plats.join(self.categories)
+        ).order_by(self.categories.c.nom, self.plats.c.prix)
+        
+        queries['commandes_client'] = select(
+            self.commandes.c.id.label('commande_id'),
+            self.commandes.c.date_commande,
+            self.commandes.c.total
+        ).select_from(
+            self.commandes.join(self.clients)
+        ).where(
+            self.clients.c.nom == bindparam('client_nom', 'Amine Lahmidi')
+        ).order_by(self.commandes.c.date_commande)
+        
+        if summaries is None:
+            summaries = self.use_summaries
+        
+        if summaries:
+            queries.update(self._summary_queries())
+            return queries
+        
+        queries['top_plats'] = select(
+            self.plats.c.nom.label('plat'),
+            func.sum(self.commande_plats.c.quantite).label('total_commande')
+        ).select_from(
+            self.plats.join(self.commande_plats)
+        ).group_by(
+            self.plats.c.id, self.plats.c.nom
+        ).order_by(
+            func.sum(self.commande_plats.c.quantite).desc(), self.plats.c.id
+        ).limit(5)
+        
+        queries['ca_par_categorie'] = select(
+            self.categories.c.nom.label('categorie'),
+            func.sum(self.plats.c.prix * self.commande_plats.c.quantite).label('ca')
+        ).select_from(
+            self.categories
+            .join(self.plats)
+            .join(self.commande_plats)
+        ).group_by(
+            self.categories.c.id, self.categories.c.nom
+        ).order_by(
+            func.sum(self.plats.c.prix * self.commande_plats.c.quantite).desc(), self.categories.c.id
+        )
+        
+        queries['clients_fideles'] = select(
+            self.clients.c.nom.label('client'),
+            func.count(self.commandes.c.id).label('nb_commandes'),
+            func.sum(self.commandes.c.total).label('total_depense')
+        ).select_from(
+            self.clients.join(self.commandes)
+        ).group_by(
+            self.clients.c.id, self.clients.c.nom
+        ).order_by(
+            func.count(self.commandes.c.id).desc(), self.clients.c.id
+        )
+        
+        queries['notes_moyennes'] = select(
+            self.plats.c.nom.label('plat'),
+            func.avg(self.avis.c.note).label('note_moyenne'),
+            func.count(self.avis.c.id).label('nb_avis')
+        ).select_from(
+            self.plats.join(self.avis)
+        ).group_by(
+            self.plats.c.id, self.plats.c.nom
+        ).order_by(
+            func.avg(self.avis.c.note).desc(), self.plats.c.id
+        )
+        
+        return queries
+    
+    def _report_query(self, name, limit=None):
+        if self.use_summaries not in self._queries:
+            self._queries[self.use_summaries] = {**self.sample_queries(), **self.period_queries()}
+        query = self._queries[self.use_summaries][name]
+        if limit is not None:
+            query = query.limit(limit)
+        return query
+
+
+class RestaurantDatabase(RestaurantSchema):
+    def __init__(self, connection_string, use_summaries=True, cache_size=256, cache_ttl=60,
+                 pool_size=None, max_overflow=None, pool_timeout=None, pool_recycle=None,
+                 pre_ping_idle=None, partitioned=False, lazy=False, engine=None):
+        self.connection_string = connection_string
+        self.use_summaries = use_summaries
+        self.cache = QueryCache(cache_size, cache_ttl) if cache_size else None
+        self.profiler = None
+        self.analytics = None
+        self._recipes = None
+        # Same staleness bound as cached reports for recipe edits made by other processes
+        self._recipes_ttl = cache_ttl
+        self._recipes_lock = threading.Lock()
+        # Shared engine: its pool settings and metrics belong to whoever created it
+        self.pool_metrics = PoolMetrics.for_engine(engine) if engine is not None else PoolMetrics()
+        self._pool_options = (pool_size, max_overflow, pool_timeout, pool_recycle, pre_ping_idle)
+        self._engine = engine
+        self._engine_lock = threading.Lock()
+        
+        backend = make_url(connection_string).get_backend_name()
+        if partitioned and backend != 'postgresql':
+            logger.warning(f"Partitionnement non supporté par {backend}, tables simples utilisées")
+            partitioned = False
+        self.partitioned = partitioned
+        self._bind_schema()
+        
+        if lazy:
+            return
+        
+        try:
+            with self.engine.connect() as conn:
+                conn.execute(select(1))
+                logger.info("Connexion de base de donnée reussi!")
+                
+        except Exception as e:
+            logger.error(f"Échec pour connecter a la database: {e}")
+            raise
+    
+    @property
+    def engine(self):
+        """Created on first use, so a lazy instance costs nothing until it touches the database."""
+        if self._engine is None:
+            with self._engine_lock:
+                if self._engine is None:
+                    self._engine = self._create_engine()
+        return self._engine
+    
+    def _create_engine(self):
+        pool_kwargs, pre_ping_idle = _pool_settings(self.connection_string, *self._pool_options)
+        engine = create_engine(
+            self.connection_string, 
+            echo=False,
+            connect_args=_connect_args(self.connection_string),
+            **pool_kwargs
+        )
+        self.pool_metrics.attach(engine, pre_ping_idle)
+        if isinstance(engine.pool, MeteredQueuePool):
+            engine.pool.metrics = self.pool_metrics
+        return engine
+    
+    def dispose(self):
+        if self._engine is not None:
+            self._engine.dispose()
+    
+    def create_tables(self):
+        try:
+            self.metadata.create_all(self.engine)
+            if self.partitioned:
+                self.ensure_partitions()
+            logger.info("Tables cree avec succes")
+        except Exception as e:
+            logger.error(f"Erreur pendant la creation des tables: {e}")
+            raise
+    
+    def create_indexes(self):
+        for table in self.metadata.sorted_tables:
+            for index in table.indexes:
+                index.create(self.engine, checkfirst=True)
+        logger.info("Index cree avec succes")
+    
+    def drop_indexes(self):
+        """Drop the secondary indexes, e.g. before a large bulk load."""
+        for table in self.metadata.sorted_tables:
+            for index in table.indexes:
+                index.drop(self.engine, checkfirst=True)
+        logger.info("Index supprimé")
+    
+    def create_search_indexes(self):
+        """Add the search indexes to an existing database, or rebuild them with the current options."""
+        dialect = self.engine.dialect.name
+        with self.engine.begin() as conn:
+            if dialect == 'postgresql':
+                conn.exec_driver_sql("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+                for table_name in SEARCH_FIELDS:
+                    for index in self.metadata.tables[table_name].indexes:
+                        if index.name.startswith(f'ix_{table_name}_recherche_'):
+                            index.create(conn, checkfirst=True)
+            elif dialect == 'sqlite':
+                for table_name, fields in SEARCH_FIELDS.items():
+                    # Recreated so an index built with other prefix lengths picks up the new ones
+                    conn.exec_driver_sql(f"DROP TABLE IF EXISTS {table_name}_recherche")
+                    for statement in self._fts_ddl(table_name, fields):
+                        conn.exec_driver_sql(statement)
+                    conn.exec_driver_sql(
+                        f"INSERT INTO {table_name}_recherche({table_name}_recherche) VALUES ('rebuild')"
+                    )
+            else:
+                raise NotImplementedError(f"Recherche plein texte non supportée par {dialect}")
+        logger.info("Index de recherche cree avec succes")
+    
+    def drop_tables(self):
+        try:
+            self.metadata.drop_all(self.engine)
+            logger.info("Tables supprimé")
+        except Exception as e:
+            logger.error(f"Erreur pendant suppression des tables: {e}")
+            raise
+    
+    def insert_sample_data(self):
+        data = self.sample_data()
+        if self.partitioned:
+            self.ensure_partitions(debut=min(row['date_commande'] for row in data['commandes']), mois_a_venir=0)
+        # Upserted rather than inserted so running the program twice leaves the data as is
+        results = self.sync_all(data)
+        logger.info("Donnée d'exemple inseré avec succes")
+        return results
+    
+    def _coerce_row(self, table, row):
+        coerced = {}
+        for column in table.columns:
+            if column.name not in row:
+                continue
+            value = row[column.name]
+            if value == '':
+                value = None
+            if isinstance(value, str):
+                if isinstance(column.type, Integer):
+                    value = int(value)
+                elif isinstance(column.type, Numeric):
+                    value = Decimal(value)
+                elif isinstance(column.type, DateTime):
+                    value = datetime.fromisoformat(value)
+            coerced[column.name] = value
+        return coerced
+    
+    def _read_rows(self, path):
+        if path.endswith('.jsonl'):
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    if line.strip():
+                        yield json.loads(line)
+        elif path.endswith('.csv'):
+            with open(path, newline='', encoding='utf-8') as f:
+                yield from csv.DictReader(f)
+        else:
+            raise ValueError(f"Format de fichier non supporté: {path}")
+    
+    def _copy_chunk(self, conn, table, columns, chunk):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in chunk:
+            writer.writerow([row.get(name) for name in columns])
+        buffer.seek(0)
+        statement = f"COPY {table.name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)"
+        cursor = conn.connection.cursor()
+        try:
+            if conn.dialect.driver == 'psycopg2':
+                cursor.copy_expert(statement, buffer)
+            else:
+                # psycopg 3 streams through a context manager instead of copy_expert
+                with cursor.copy(statement) as copy:
+                    copy.write(buffer.getvalue())
+        finally:
+            cursor.close()
+    
+    def bulk_load(self, table_name, source, chunk_size=10000, refresh_summaries=True):
+        """Stream rows (iterable of dicts, or a .csv/.jsonl path) into one table."""
+        table = self.metadata.tables[table_name]
+        rows = self._read_rows(source) if isinstance(source, str) else iter(source)
+        dialect = self.engine.dialect
+        # COPY needs a driver-level API: psycopg2's copy_expert or psycopg 3's copy()
+        use_copy = dialect.name == 'postgresql' and dialect.driver in ('psycopg2', 'psycopg')
+        loaded = 0
+        start = time.perf_counter()
+        
+        with self.engine.connect() as conn:
+            try:
+                trans = conn.begin()
+                while True:
+                    chunk = [self._coerce_row(table, row) for row in islice(rows, chunk_size)]
+                    if not chunk:
+                        break
+                    if use_copy:
+                        columns = [name for name in table.columns.keys() if name in chunk[0]]
+                        self._copy_chunk(conn, table, columns, chunk)
+                    else:
+                        conn.execute(insert(table), chunk)
+                    loaded += len(chunk)
+                if dialect.name == 'postgresql':
+                    self._reset_sequence(conn, table)
+                trans.commit()
+                # Explicit ids may land below the analytics watermark
+                self._invalidate([table_name], reload=True)
+            except Exception as e:
+                trans.rollback()
+                logger.error(f"Erreur pendant le chargement de {table_name}: {e}")
+                raise
+        
+        elapsed = time.perf_counter() - start
+        rate = loaded / elapsed if elapsed > 0 else 0.0
+        logger.info(f"{table_name}: {loaded} lignes en {elapsed:.2f}s ({rate:,.0f} lignes/s)")
+        if refresh_summaries and loaded and table_name in SUMMARY_SOURCES:
+            self.refresh_summaries()
+        return {'table': table_name, 'rows': loaded, 'seconds': elapsed, 'rows_per_sec': rate}
+    
+    def bulk_load_all(self, sources, chunk_size=10000):
+        """Load several tables in foreign-key order; sources maps table name to rows or a file path."""
+        unknown = set(sources) - set(TABLE_LOAD_ORDER)
+        if unknown:
+            raise ValueError(f"Tables inconnues: {', '.join(sorted(unknown))}")
+        stats = [
+            self.bulk_load(table_name, sources[table_name], chunk_size, refresh_summaries=False)
+            for table_name in TABLE_LOAD_ORDER
+            if table_name in sources
+        ]
+        if SUMMARY_SOURCES & set(sources):
+            self.refresh_summaries()
+        return stats
+    
+    def _sync_source(self, conn, table_name, source, key, batch_size, summaries=None):
+        table = self.metadata.tables[table_name]
+        rows = self._read_rows(source) if isinstance(source, str) else iter(source)
+        counts = {'inserted': 0, 'updated': 0, 'unchanged': 0}
+        while True:
+            batch = [self._coerce_row(table, row) for row in islice(rows, batch_size)]
+            if not batch:
+                break
+            for name, count in self._sync_table(conn, table, batch, key, summaries).items():
+                counts[name] += count
+        logger.info(
+            f"{table_name}: {counts['inserted']} inserées, {counts['updated']} mises a jour, "
+            f"{counts['unchanged']} inchangées"
+        )
+        return counts
+    
+    def sync(self, table_name, source, key=None, batch_size=1000, refresh_summaries=True):
+        """Idempotent upsert of a feed (iterable of dicts, or a .csv/.jsonl path) into one table.
+        
+        Rows are matched on key (SYNC_KEYS entry or primary key by default) and only
+        new or modified rows are written. Returns inserted/updated/unchanged counts.
+        """
+        return self.sync_all({table_name: source}, {table_name: key} if key else None,
+                             batch_size, refresh_summaries)[table_name]
+    
+    def sync_all(self, sources, keys=None, batch_size=1000, refresh_summaries=True):
+        """Sync several tables in foreign-key order within one transaction; returns counts per table."""
+        unknown = set(sources) - set(TABLE_LOAD_ORDER)
+        if unknown:
+            raise ValueError(f"Tables inconnues: {', '.join(sorted(unknown))}")
+        keys = keys or {}
+        results = {}
+        summaries = {'rebuild': False, 'updated': False} if refresh_summaries else None
+        with self.engine.connect() as conn:
+            try:
+                trans = conn.begin()
+                for table_name in TABLE_LOAD_ORDER:
+                    if table_name in sources:
+                        results[table_name] = self._sync_source(
+                            conn, table_name, sources[table_name], keys.get(table_name), batch_size, summaries
+                        )
+                changed = [name for name, counts in results.items() if counts['inserted'] or counts['updated']]
+                # Only price/category edits or rewritten orders and avis need the full re-aggregation
+                if summaries is not None and summaries['rebuild']:
+                    self._rebuild_summaries(conn)
+                trans.commit()
+            except Exception as e:
+                trans.rollback()
+                logger.error(f"Erreur pendant la synchronisation: {e}")
+                raise
+        
+        # Synced rows carry their own ids, so inserts as well as updates can sit below the
+        # snapshot watermarks and need a full reread
+        self._invalidate(changed, reload=True)
+        if summaries is not None and (summaries['rebuild'] or summaries['updated']):
+            self._invalidate(SUMMARY_SOURCES)
+        return results
+    
+    def _normalize_order(self, order):
+        lignes = order['lignes']
+        if isinstance(lignes, dict):
+            lignes = lignes.items()
+        quantites = defaultdict(int)
+        for plat_id, quantite in lignes:
+            if quantite <= 0:
+                raise ValueError(f"Quantité invalide pour le plat {plat_id}: {quantite}")
+            quantites[plat_id] += quantite
+        if not quantites:
+            raise ValueError(f"Commande vide pour le client {order['client_id']}")
+        return order['client_id'], order.get('date_commande') or datetime.now(), dict(quantites)
+    
+    def _insert_commandes(self, conn, rows):
+        stmt = insert(self.commandes)
+        if conn.dialect.insert_executemany_returning_sort_by_parameter_order:
+            result = conn.execute(stmt.returning(self.commandes.c.id, sort_by_parameter_order=True), rows)
+            return [row.id for row in result]
+        return [conn.execute(stmt, row).inserted_primary_key[0] for row in rows]
+    
+    def _normalize_avis(self, avis):
+        note = avis['note']
+        if not 1 <= note <= 5:
+            raise ValueError(f"Note invalide pour le plat {avis['plat_id']}: {note}")
+        return {
+            'client_id': avis['client_id'],
+            'plat_id': avis['plat_id'],
+            'note': note,
+            'commentaire': avis.get('commentaire'),
+            'date_avis': avis.get('date_avis') or datetime.now(),
+        }
+    
+    def _place_orders(self, conn, orders, check_stock):
+        """Place normalized orders inside the caller's transaction.
+        
+        Returns the placed orders with the commandes and commande_plats rows written;
+        the caller applies them to the summaries, after every other lock is taken.
+        """
+        if not orders:
+            return [], [], []
+        plat_ids = sorted({plat_id for _, _, quantites in orders for plat_id in quantites})
+        
+        prix = dict(conn.execute(
+            select(self.plats.c.id, self.plats.c.prix).where(self.plats.c.id.in_(plat_ids))
+        ).all())
+        inconnus = [plat_id for plat_id in plat_ids if plat_id not in prix]
+        if inconnus:
+            raise ValueError(f"Plats inconnus: {inconnus}")
+        
+        volumes = defaultdict(int)
+        for _, _, quantites in orders:
+            for plat_id, quantite in quantites.items():
+                volumes[plat_id] += quantite
+        besoins = defaultdict(Decimal)
+        recettes = conn.execute(
+            select(
+                self.plat_ingredients.c.plat_id,
+                self.plat_ingredients.c.ingredient_id,
+                self.plat_ingredients.c.quantite_necessaire
+            ).where(self.plat_ingredients.c.plat_id.in_(plat_ids))
+        )
+        for plat_id, ingredient_id, quantite_necessaire in recettes:
+            besoins[ingredient_id] += Decimal(str(quantite_necessaire)) * volumes[plat_id]
+        
+        ingredient_ids = sorted(besoins)
+        if ingredient_ids:
+            # Always lock in ascending id order so concurrent batches cannot deadlock
+            stocks = dict(conn.execute(
+                select(self.ingredients.c.id, self.ingredients.c.stock)
+                .where(self.ingredients.c.id.in_(ingredient_ids))
+                .order_by(self.ingredients.c.id)
+                .with_for_update()
+            ).all())
+            if check_stock:
+                manquants = [
+                    ingredient_id for ingredient_id in ingredient_ids
+                    if Decimal(str(stocks[ingredient_id])) < besoins[ingredient_id]
+                ]
+                if manquants:
+                    raise ValueError(f"Stock insuffisant pour les ingredients {manquants}")
+        
+        commandes_data = [
+            {
+                'client_id': client_id,
+                'date_commande': date_commande,
+                'total': sum(
+                    (Decimal(str(prix[plat_id])) * quantite for plat_id, quantite in quantites.items()),
+                    Decimal(0)
+                ).quantize(Decimal('0.01'))
+            }
+            for client_id, date_commande, quantites in orders
+        ]
+        commande_ids = self._insert_commandes(conn, commandes_data)
+        
+        commande_plats_data = [
+            {'commande_id': commande_id, 'plat_id': plat_id, 'quantite': quantite}
+            for commande_id, (_, _, quantites) in zip(commande_ids, orders)
+            for plat_id, quantite in sorted(quantites.items())
+        ]
+        if self.partitioned:
+            dates = dict(zip(commande_ids, (row['date_commande'] for row in commandes_data)))
+            for row in commande_plats_data:
+                row['date_commande'] = dates[row['commande_id']]
+        conn.execute(insert(self.commande_plats), commande_plats_data)
+        
+        if ingredient_ids:
+            conn.execute(
+                self.ingredients.update()
+                .where(self.ingredients.c.id.in_(ingredient_ids))
+                .values(stock=self.ingredients.c.stock - case(
+                    {ingredient_id: besoins[ingredient_id] for ingredient_id in ingredient_ids},
+                    value=self.ingredients.c.id
+                ))
+            )
+        
+        placees = [
+            CommandePlacee(commande_id, row['client_id'], row['date_commande'], row['total'])
+            for commande_id, row in zip(commande_ids, commandes_data)
+        ]
+        return placees, commandes_data, commande_plats_data
+    
+    def place_orders_batch(self, orders, check_stock=True):
+        """Place many orders in one transaction with a fixed number of statements.
+        
+        Each order is a dict with client_id, lignes ({plat_id: quantite} or pairs)
+        and an optional date_commande. Totals come from plats.prix and ingredient
+        stock is decremented by a single UPDATE for the whole batch.
+        """
+        orders = [self._normalize_order(order) for order in orders]
+        if not orders:
+            return []
+        
+        with self.engine.connect() as conn:
+            try:
+                trans = conn.begin()
+                placees, commandes_data, commande_plats_data = self._place_orders(conn, orders, check_stock)
+                self._update_summaries(conn, commandes=commandes_data, commande_plats=commande_plats_data)
+                trans.commit()
+            except Exception as e:
+                trans.rollback()
+                logger.error(f"Erreur pendant l'enregistrement des commandes: {e}")
+                raise
+        
+        self._invalidate(['commandes', 'commande_plats', 'ingredients'])
+        return placees
+    
+    def place_order(self, client_id, lignes, date_commande=None, check_stock=True):
+        return self.place_orders_batch(
+            [{'client_id': client_id, 'lignes': lignes, 'date_commande': date_commande}],
+            check_stock
+        )[0]
+    
+    def add_avis_batch(self, avis):
+        """Insert many avis (client_id, plat_id, note, commentaire, date_avis) in one transaction."""
+        rows = [self._normalize_avis(row) for row in avis]
+        if not rows:
+            return 0
+        
+        with self.engine.connect() as conn:
+            try:
+                trans = conn.begin()
+                conn.execute(insert(self.avis), rows)
+                self._update_summaries(conn, avis=rows)
+                trans.commit()
+            except Exception as e:
+                trans.rollback()
+                logger.error(f"Erreur pendant l'enregistrement des avis: {e}")
+                raise
+        
+        self._invalidate(['avis'])
+        return len(rows)
+    
+    def write_events(self, avis=(), orders=(), check_stock=True):
+        """Insert avis and place orders together, with a single commit for the whole batch.
+        
+        Both lists must already be normalized; this is the flush path of WriteBehindQueue.
+        """
+        with self.engine.connect() as conn:
+            with conn.begin():
+                # Same lock order as place_orders_batch: ingredients first, then every summary
+                # delta in a single pass, so concurrent writers never wait on each other in a cycle
+                placees, commandes_data, commande_plats_data = self._place_orders(conn, orders, check_stock)
+                if avis:
+                    conn.execute(insert(self.avis), avis)
+                self._update_summaries(
+                    conn, commandes=commandes_data, commande_plats=commande_plats_data, avis=avis
+                )
+        
+        self._invalidate(
+            (['avis'] if avis else []) + (['commandes', 'commande_plats', 'ingredients'] if orders else [])
+        )
+        return placees
+    
+    def write_behind(self, **options):
+        """Start a WriteBehindQueue in front of this database; close() it on shutdown."""
+        return WriteBehindQueue(self, **options)
+    
+    def _recipe_matrix(self, conn, plat_ids=()):
+        """Cached matrix, rebuilt once expired or when it lacks one of plat_ids (added elsewhere)."""
+        with self._recipes_lock:
+            recettes = self._recipes
+            if (recettes is None or time.monotonic() - recettes.built_at > self._recipes_ttl
+                    or (len(plat_ids) and not recettes.positions(plat_ids)[1].all())):
+                self._recipes = RecipeMatrix(conn, self)
+            return self._recipes
+    
+    def _ingredient_columns(self, conn, np, *names):
+        # Only the requested columns: Decimal conversion dominates the cost of this read
+        converters = {
+            'id': lambda values: np.fromiter(values, dtype=np.int64, count=len(values)),
+            'nom': lambda values: np.array(values, dtype=object),
+            'cout_unitaire': lambda values: np.fromiter(
+                (int(cout * 100) for cout in values), dtype=np.int64, count=len(values)
+            ),
+            'stock': lambda values: np.fromiter(
+                (int(stock * 1000) for stock in values), dtype=np.int64, count=len(values)
+            ),
+            'fournisseur_id': lambda values: np.fromiter(values, dtype=np.int64, count=len(values)),
+        }
+        names = ('id',) + names
+        rows = list(zip(*conn.execute(
+            select(*(self.ingredients.c[name] for name in names)).order_by(self.ingredients.c.id)
+        ).all())) or [()] * len(names)
+        return {name: converters[name](values) for name, values in zip(names, rows)}
+    
+    def recipe_costs(self):
+        """Food cost and margin of every plat against plats.prix, lowest margin rate first."""
+        with self.engine.connect() as conn:
+            recettes = self._recipe_matrix(conn)
+            np = recettes.np
+            couts = recettes.costs(self._ingredient_columns(conn, np, 'cout_unitaire'))
+        
+        # Costs are in 1e-5 DH and prices in cents: compare both in 1e-5 DH
+        prix = recettes.prix * 1000
+        marges = prix - couts
+        taux = np.divide(marges, prix, out=np.zeros(len(prix)), where=prix != 0)
+        order = np.lexsort((recettes.plat_ids, taux))
+        centime = Decimal('0.01')
+        return tuple(
+            CoutPlat(
+                recettes.plat_noms[i],
+                Decimal(int(recettes.prix[i])).scaleb(-2),
+                Decimal(int(couts[i])).scaleb(-5).quantize(centime),
+                Decimal(int(marges[i])).scaleb(-5).quantize(centime),
+                float(taux[i])
+            )
+            for i in order
+        )
+    
+    def ingredient_demand(self, lignes):
+        """Ingredient quantities needed for lignes ({plat_id: quantite} or pairs), by ingredient id."""
+        if isinstance(lignes, dict):
+            lignes = lignes.items()
+        lignes = list(lignes)
+        with self.engine.connect() as conn:
+            recettes = self._recipe_matrix(conn, [plat_id for plat_id, _ in lignes])
+            np = recettes.np
+            ingredients = self._ingredient_columns(conn, np)
+        
+        volumes = np.zeros(len(recettes.plat_ids), dtype=np.int64)
+        for plat_id, quantite in lignes:
+            positions, known = recettes.positions([plat_id])
+            if not known[0]:
+                raise ValueError(f"Plat inconnu: {plat_id}")
+            volumes[positions[0]] += quantite
+        besoins = recettes.demand(volumes, ingredients)
+        return {
+            int(ingredients['id'][i]): Decimal(int(besoins[i])).scaleb(-3)
+            for i in np.flatnonzero(besoins)
+        }
+    
+    def _plat_volumes(self, conn, debut, fin):
+        if self.partitioned:
+            lignes, dates = self.commande_plats, self.commande_plats.c.date_commande
+        else:
+            lignes, dates = self.commande_plats.join(self.commandes), self.commandes.c.date_commande
+        return conn.execute(
+            select(self.commande_plats.c.plat_id, func.sum(self.commande_plats.c.quantite))
+            .select_from(lignes)
+            .where((dates >= debut) & (dates < fin))
+            .group_by(self.commande_plats.c.plat_id)
+        ).all()
+    
+    def stock_forecast(self, jours=28, fin=None, delai_livraison=3, stock_securite=2, couverture=7):
+        """Project stock depletion from the last jours of commande_plats, soonest shortage first.
+        
+        The daily consumption is the recipe demand of the plats sold over the window.
+        An ingredient reaches its reorder point when its stock covers no more than
+        delai_livraison + stock_securite days; a_commander then restores couverture
+        extra days on top of that.
+        """
+        fin = fin or datetime.now()
+        with self.engine.connect() as conn:
+            ventes = self._plat_volumes(conn, fin - timedelta(days=jours), fin)
+            plat_ids, quantites = zip(*ventes) if ventes else ((), ())
+            # Sales are read first so a plat added by another instance forces a rebuild
+            recettes = self._recipe_matrix(conn, plat_ids)
+            np = recettes.np
+            ingredients = self._ingredient_columns(conn, np, 'nom', 'stock', 'fournisseur_id')
+            fournisseurs = dict(conn.execute(select(self.fournisseurs.c.id, self.fournisseurs.c.nom)).all())
+        
+        volumes = np.zeros(len(recettes.plat_ids), dtype=np.int64)
+        if ventes:
+            positions, known = recettes.positions(plat_ids)
+            # Only a plat deleted since the sales were read is still unknown; it has no recipe left
+            volumes[positions[known]] = np.array(quantites, dtype=np.int64)[known]
+        
+        # Everything below is in thousandths of a unit
+        consommation = recettes.demand(volumes, ingredients) / jours
+        stock = ingredients['stock']
+        point_commande = consommation * (delai_livraison + stock_securite)
+        cible = point_commande + consommation * couverture
+        a_commander = np.where(stock <= point_commande, np.maximum(cible - stock, 0), 0)
+        jours_restants = np.divide(stock, consommation, out=np.full(len(stock), np.inf), where=consommation > 0)
+        order = np.lexsort((ingredients['id'], jours_restants))
+        
+        millieme = Decimal('0.001')
+        quantite = lambda value: (Decimal(float(value)) / 1000).quantize(millieme)
+        return tuple(
+            PrevisionStock(
+                ingredients['nom'][i],
+                fournisseurs.get(int(ingredients['fournisseur_id'][i])),
+                Decimal(int(stock[i])).scaleb(-3),
+                quantite(consommation[i]),
+                float(jours_restants[i]) if consommation[i] > 0 else None,
+                quantite(point_commande[i]),
+                quantite(a_commander[i])
             )
-            self.metadata = MetaData()
-            self.define_tables()
-            
+            for i in order
+        )
+    
+    def commandes_fournisseurs(self, **options):
+        """Ingredients at or below their reorder point, grouped by fournisseur (stock_forecast options)."""
+        commandes = defaultdict(list)
+        for prevision in self.stock_forecast(**options):
+            if prevision.a_commander > 0:
+                commandes[prevision.fournisseur].append(prevision)
+        return {fournisseur: tuple(lignes) for fournisseur, lignes in commandes.items()}
+    
+    def _export_keys(self, table, order_by):
+        pk = list(table.primary_key.columns)
+        if order_by is None:
+            return pk
+        keys = [table.c[order_by]]
+        # The primary key breaks ties so the keyset stays strictly increasing
+        return keys + [column for column in pk if column.name != order_by]
+    
+    def _read_checkpoint(self, checkpoint):
+        try:
+            with open(checkpoint, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+    
+    def _write_checkpoint(self, checkpoint, state):
+        tmp = checkpoint + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(state, f, default=_export_value)
+        os.replace(tmp, checkpoint)
+    
+    def _keyset_pages(self, table, keys, last_key, batch_size):
+        while True:
+            query = select(table).order_by(*keys).limit(batch_size)
+            if last_key is not None:
+                query = query.where(tuple_(*keys) > tuple_(*last_key))
             with self.engine.connect() as conn:
-                conn.execute(select(1))
-                logger.info("Connexion de base de donnée reussi!")
+                rows = conn.execute(query).all()
+            if not rows:
+                return
+            last_key = [rows[-1]._mapping[key.name] for key in keys]
+            yield rows, last_key
+    
+    def _report_pages(self, name, batch_size, params):
+        with self.engine.connect() as conn:
+            result = conn.execution_options(stream_results=True, yield_per=batch_size).execute(
+                self._report_query(name), params
+            )
+            for rows in result.partitions():
+                yield rows, None
+    
+    def export(self, source, path, format=None, batch_size=10000, order_by=None, resume=True, **params):
+        """Stream a table or a report to CSV, JSONL or Parquet with constant memory.
+        
+        Tables are read by keyset pagination on the primary key, or on
+        order_by (e.g. 'date_commande') plus the key. After every page the
+        last key and file offset go to a checkpoint next to the file, so an
+        interrupted table export resumes where it stopped. Parquet output
+        goes to part files of _ParquetExportWriter.part_rows rows, and the
+        checkpoint only moves when a part is closed. Reports are streamed
+        through a server-side cursor and always restart; the *_periode
+        reports take debut and fin, defaulting to the whole history.
+        """
+        format = format or os.path.splitext(path)[1].lstrip('.').lower()
+        if format not in EXPORT_WRITERS:
+            raise ValueError(f"Format d'export non supporté: {format}")
+        
+        checkpoint = path + '.checkpoint'
+        if source in self.metadata.tables:
+            table = self.metadata.tables[source]
+            keys = self._export_keys(table, order_by)
+            columns = [column.name for column in table.columns]
+            types = [column.type for column in table.columns]
+        elif source in REPORT_ROW_TYPES:
+            table = None
+            columns = list(REPORT_ROW_TYPES[source]._fields)
+            types = [column.type for column in self._report_query(source).selected_columns]
+            if source.endswith('_periode'):
+                params = self._periode(params.get('debut'), params.get('fin'))
+        else:
+            raise ValueError(f"Table ou rapport inconnu: {source}")
+        
+        state = self._read_checkpoint(checkpoint) if resume and table is not None else None
+        if state and (state.get('source') != source or state.get('order_by') != order_by):
+            state = None
+        last_key = None
+        exported = 0
+        if state:
+            last_key = state['last_key']
+            exported = state['rows']
+            key_types = [key.type for key in keys]
+            last_key = [
+                datetime.fromisoformat(value) if isinstance(key_type, DateTime) else value
+                for value, key_type in zip(last_key, key_types)
+            ]
+            if state.get('offset') is not None and os.path.exists(path):
+                # Drop anything written after the last checkpoint
+                with open(path, 'r+b') as f:
+                    f.truncate(state['offset'])
+            logger.info(f"Reprise de l'export {source} apres {exported} lignes")
+        
+        writer = EXPORT_WRITERS[format](path, columns, append=bool(state), types=types)
+        start = time.perf_counter()
+        written = 0
+        complete = False
+        try:
+            if table is not None:
+                pages = self._keyset_pages(table, keys, last_key, batch_size)
+            else:
+                pages = self._report_pages(source, batch_size, params)
+            for rows, last_key in pages:
+                offset = writer.write(rows)
+                written += len(rows)
+                if table is not None and writer.durable():
+                    self._write_checkpoint(checkpoint, {
+                        'source': source, 'order_by': order_by, 'format': format,
+                        'last_key': last_key, 'rows': exported + written, 'offset': offset,
+                    })
+            complete = True
+        finally:
+            writer.close(complete)
+        
+        if os.path.exists(checkpoint):
+            os.remove(checkpoint)
+        elapsed = time.perf_counter() - start
+        rate = written / elapsed if elapsed > 0 else 0.0
+        logger.info(f"Export {source} -> {path}: {written} lignes en {elapsed:.2f}s ({rate:,.0f} lignes/s)")
+        return {'source': source, 'path': path, 'format': format, 'rows': exported + written,
+                'rows_this_run': written, 'seconds': elapsed, 'rows_per_sec': rate}
+    
+    def refresh_summaries(self):
+        """Rebuild every summary table from the raw tables in one transaction."""
+        with self.engine.connect() as conn:
+            try:
+                trans = conn.begin()
+                self._rebuild_summaries(conn)
+                trans.commit()
+                self._invalidate(SUMMARY_SOURCES)
+                logger.info("Tables de synthese reconstruites")
+            except Exception as e:
+                trans.rollback()
+                logger.error(f"Erreur pendant la reconstruction des syntheses: {e}")
+                raise
+    
+    def check_summaries(self):
+        """Compare the summary tables with the raw aggregates and list every mismatch."""
+        ecarts = []
+        with self.engine.connect() as conn:
+            for table, source in self._summary_sources().items():
+                keys = [column.name for column in table.primary_key.columns]
+                counters = [column.name for column in table.columns if column.name not in keys]
                 
-        except Exception as e:
-            logger.error(f"Échec pour connecter a la database: {e}")
-            raise
+                def index(rows):
+                    return {
+                        tuple(row._mapping[key] for key in keys):
+                        tuple(Decimal(str(row._mapping[name])).quantize(Decimal('0.01')) for name in counters)
+                        for row in rows
+                    }
+                
+                attendu = index(conn.execute(source))
+                trouve = index(conn.execute(select(table)))
+                for key in sorted(set(attendu) | set(trouve)):
+                    if attendu.get(key) != trouve.get(key):
+                        ecarts.append({
+                            'table': table.name, 'cle': key,
+                            'attendu': attendu.get(key), 'trouve': trouve.get(key)
+                        })
+        
+        if ecarts:
+            logger.warning(f"{len(ecarts)} ecart(s) entre les syntheses et les tables brutes")
+        else:
+            logger.info("Tables de synthese coherentes")
+        return ecarts
     
-    def define_tables(self):
-        self.categories = Table('categories', self.metadata,
-            Column('id', Integer, primary_key=True),
-            Column('nom', String(50), nullable=False)
-        )
+    def list_partitions(self):
+        """Monthly partitions currently attached to each partitioned table."""
+        if not self.partitioned:
+            return {}
+        partitions = {}
+        with self.engine.connect() as conn:
+            for table_name in PARTITIONED_TABLES:
+                rows = conn.exec_driver_sql(
+                    "SELECT c.relname FROM pg_inherits i "
+                    "JOIN pg_class c ON c.oid = i.inhrelid "
+                    "JOIN pg_class p ON p.oid = i.inhparent "
+                    "WHERE p.relname = %(table)s ORDER BY c.relname",
+                    {'table': table_name}
+                )
+                partitions[table_name] = [row[0] for row in rows]
+        return partitions
+    
+    def ensure_partitions(self, debut=None, mois_a_venir=3):
+        """Create the monthly partitions from debut's month up to mois_a_venir months ahead.
         
-        self.fournisseurs = Table('fournisseurs', self.metadata,
-            Column('id', Integer, primary_key=True),
-            Column('nom', String(100), nullable=False),
-            Column('contact', String(100), nullable=False)
-        )
+        There is no DEFAULT partition, so rows outside the created months are
+        rejected; run this from cron ahead of time and before loading history.
+        """
+        if not self.partitioned:
+            logger.info("Partitionnement inactif, aucune partition a creer")
+            return []
+        mois = _month_start(debut or datetime.now())
+        limite = _add_months(_month_start(datetime.now()), mois_a_venir)
+        limite = max(limite, mois)
         
-        self.plats = Table('plats', self.metadata,
-            Column('id', Integer, primary_key=True),
-            Column('nom', String(100), nullable=False),
-            Column('prix', Numeric(10, 2), nullable=False),
-            Column('description', String(255)),
-            Column('categorie_id', Integer, ForeignKey('categories.id'), nullable=False)
-        )
+        created = []
+        with self.engine.begin() as conn:
+            while mois <= limite:
+                suivant = _add_months(mois, 1)
+                # Parents first so the composite foreign key of commande_plats can attach
+                for table_name in reversed(list(PARTITIONED_TABLES)):
+                    name = f"{table_name}_{mois:%Y_%m}"
+                    conn.exec_driver_sql(
+                        f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {table_name} "
+                        f"FOR VALUES FROM ('{mois:%Y-%m-%d}') TO ('{suivant:%Y-%m-%d}')"
+                    )
+                    created.append(name)
+                mois = suivant
+        logger.info(f"{len(created)} partition(s) verifiée(s) jusqu'a {limite:%Y-%m}")
+        return created
+    
+    def detach_partitions(self, avant, archive_schema='archive', drop=False):
+        """Detach every monthly partition that ends on or before avant, then archive or drop it."""
+        if not self.partitioned:
+            logger.info("Partitionnement inactif, aucune partition a détacher")
+            return []
+        limite = _month_start(avant)
+        pattern = re.compile(r'_(\d{4})_(\d{2})$')
+        detached = []
+        partitions = self.list_partitions()
+        with self.engine.begin() as conn:
+            if archive_schema and not drop:
+                conn.exec_driver_sql(f"CREATE SCHEMA IF NOT EXISTS {archive_schema}")
+            # Children first: order lines must leave before the orders they reference
+            for table_name in PARTITIONED_TABLES:
+                for name in partitions[table_name]:
+                    match = pattern.search(name)
+                    if not match or _add_months(datetime(int(match[1]), int(match[2]), 1), 1) > limite:
+                        continue
+                    conn.exec_driver_sql(f"ALTER TABLE {table_name} DETACH PARTITION {name}")
+                    foreign_keys = conn.exec_driver_sql(
+                        "SELECT conname FROM pg_constraint WHERE conrelid = %(name)s::regclass AND contype = 'f'",
+                        {'name': name}
+                    ).scalars().all()
+                    for constraint in foreign_keys:
+                        conn.exec_driver_sql(f'ALTER TABLE {name} DROP CONSTRAINT "{constraint}"')
+                    if drop:
+                        conn.exec_driver_sql(f"DROP TABLE {name}")
+                    elif archive_schema:
+                        conn.exec_driver_sql(f"ALTER TABLE {name} SET SCHEMA {archive_schema}")
+                    detached.append(name)
         
-        self.clients = Table('clients', self.metadata,
-            Column('id', Integer, primary_key=True),
-            Column('nom', String(100), nullable=False),
-            Column('email', String(100), nullable=False, unique=True),
-            Column('telephone', String(20), nullable=True)
-        )
+        self._invalidate(PARTITIONED_TABLES, reload=True)
+        if detached:
+            self.refresh_summaries()
+        logger.info(f"{len(detached)} partition(s) détachée(s) avant {limite:%Y-%m}")
+        return detached
+    
+    def explain_periode(self, report, debut, fin):
+        """Plan of a date-bounded report and the monthly partitions it actually scans."""
+        name = report if report.endswith('_periode') else f"{report}_periode"
+        plan = self.explain(self.period_queries()[name], params=self._periode(debut, fin))
+        scanned = sorted({
+            match for line in plan
+            for match in re.findall(r'\b(?:%s)_\d{4}_\d{2}\b' % '|'.join(PARTITIONED_TABLES), line)
+        })
+        return {'plan': plan, 'partitions': scanned}
+    
+    def explain(self, query, conn=None, params=None):
+        """Return the plan lines the database picks for a query."""
+        if params:
+            query = query.params(**params)
+        sql = str(query.compile(dialect=self.engine.dialect, compile_kwargs={"literal_binds": True}))
+        dialect = self.engine.dialect.name
+        if dialect == 'postgresql':
+            explain_sql = f"EXPLAIN {sql}"
+        elif dialect == 'sqlite':
+            explain_sql = f"EXPLAIN QUERY PLAN {sql}"
+        else:
+            raise NotImplementedError(f"EXPLAIN non supporté pour {dialect}")
         
-        self.commandes = Table('commandes', self.metadata,
-            Column('id', Integer, primary_key=True),
-            Column('client_id', Integer, ForeignKey('clients.id'), nullable=False),
-            Column('date_commande', DateTime, nullable=False),
-            Column('total', Numeric(10, 2), nullable=False)
-        )
+        if conn is None:
+            with self.engine.connect() as conn:
+                rows = conn.exec_driver_sql(explain_sql).fetchall()
+        else:
+            rows = conn.exec_driver_sql(explain_sql).fetchall()
+        return [str(row[-1]) for row in rows]
+    
+    def check_query_indexes(self):
+        """Map every sample query to the schema indexes that show up in its plan."""
+        index_names = [index.name for table in self.metadata.sorted_tables for index in table.indexes]
+        report = {}
+        with self.engine.connect() as conn:
+            for name, query in self.sample_queries().items():
+                plan = "\n".join(self.explain(query, conn))
+                used = [index_name for index_name in index_names if index_name in plan]
+                report[name] = used
+                if used:
+                    logger.info(f"{name}: {', '.join(used)}")
+                else:
+                    logger.warning(f"{name}: aucun index utilisé\n{plan}")
+        return report
+    
+    def _invalidate(self, tables, reload=False):
+        if self.cache is not None:
+            self.cache.invalidate(tables)
+        if self.analytics is not None:
+            self.analytics.invalidate(tables, reload)
+        if RECIPE_TABLES & set(tables):
+            self._recipes = None
+    
+    def _report(self, name, limit=None, **params):
+        key = (name, self.use_summaries, limit, tuple(sorted(params.items())))
+        if self.cache is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
         
-        self.ingredients = Table('ingredients', self.metadata,
-            Column('id', Integer, primary_key=True),
-            Column('nom', String(100), nullable=False),
-            Column('cout_unitaire', Numeric(10, 2), nullable=False),
-            Column('stock', Numeric(10, 3), nullable=False),
-            Column('fournisseur_id', Integer, ForeignKey('fournisseurs.id'), nullable=False)
-        )
+        if self.analytics is not None and name in ANALYTICS_REPORTS:
+            rows = self.analytics.report(name, limit, **params)
+        else:
+            row_type = REPORT_ROW_TYPES[name]
+            with self.engine.connect() as conn:
+                rows = tuple(row_type(*row) for row in conn.execute(self._report_query(name, limit), params))
         
-        self.commande_plats = Table('commande_plats', self.metadata,
-            Column('commande_id', Integer, ForeignKey('commandes.id'), primary_key=True),
-            Column('plat_id', Integer, ForeignKey('plats.id'), primary_key=True),
-            Column('quantite', Integer, nullable=False, default=1)
-        )
+        if self.cache is not None:
+            self.cache.put(key, rows, REPORT_TABLES[name])
+        return rows
+    
+    def plats_par_categorie(self):
+        return self._report('plats_par_categorie')
+    
+    def commandes_client(self, nom):
+        return self._report('commandes_client', client_nom=nom)
+    
+    def top_plats(self, limit=5, debut=None, fin=None):
+        if debut is None and fin is None:
+            return self._report('top_plats', limit=limit)
+        return self._report('top_plats_periode', limit=limit, **self._periode(debut, fin))
+    
+    def ca_par_categorie(self, debut=None, fin=None):
+        if debut is None and fin is None:
+            return self._report('ca_par_categorie')
+        return self._report('ca_par_categorie_periode', **self._periode(debut, fin))
+    
+    def clients_fideles(self, debut=None, fin=None):
+        if debut is None and fin is None:
+            return self._report('clients_fideles')
+        return self._report('clients_fideles_periode', **self._periode(debut, fin))
+    
+    def notes_moyennes(self, debut=None, fin=None):
+        if debut is None and fin is None:
+            return self._report('notes_moyennes')
+        return self._report('notes_moyennes_periode', **self._periode(debut, fin))
+    
+    def _search_rows(self, conn, table_name, termes, prefix, limit):
+        table = self.metadata.tables[table_name]
+        fields = SEARCH_FIELDS[table_name]
+        candidats = max(SEARCH_RANKED_ROWS, limit)
         
-        self.plat_ingredients = Table('plat_ingredients', self.metadata,
-            Column('plat_id', Integer, ForeignKey('plats.id'), primary_key=True),
-            Column('ingredient_id', Integer, ForeignKey('ingredients.id'), primary_key=True),
-            Column('quantite_necessaire', Numeric(10, 3), nullable=False)
-        )
+        if conn.dialect.name == 'sqlite':
+            fts = f"{table_name}_recherche"
+            requete = ' AND '.join(f'"{terme}"' for terme in termes) + ('*' if prefix else '')
+            # bm25() is lower for better matches; negated so a higher score always ranks first.
+            # The rowid bound keeps the newest candidats matches, found without ranking them.
+            return conn.execute(text(
+                f"SELECT {fts}.rowid, {fts}.{fields[0]}, "
+                f"{f'{fts}.{fields[1]}' if len(fields) > 1 else 'NULL'}, -bm25({fts}) AS score "
+                f"FROM {fts} WHERE {fts} MATCH :requete AND {fts}.rowid >= COALESCE(("
+                f"SELECT rowid FROM {fts} WHERE {fts} MATCH :requete "
+                f"ORDER BY rowid DESC LIMIT 1 OFFSET :candidats - 1), 0) "
+                f"ORDER BY score DESC, {fts}.rowid LIMIT :limit"
+            ), {'requete': requete, 'candidats': candidats, 'limit': limit}).all()
         
-        self.avis = Table('avis', self.metadata,
-            Column('id', Integer, primary_key=True),
-            Column('client_id', Integer, ForeignKey('clients.id'), nullable=False),
-            Column('plat_id', Integer, ForeignKey('plats.id'), nullable=False),
-            Column('note', Integer, nullable=False),
-            Column('commentaire', Text, nullable=True),
-            Column('date_avis', DateTime, nullable=False)
+        document = self._search_document(table)
+        tsvector = func.to_tsvector(text("'simple'"), document)
+        tsquery = func.to_tsquery(text("'simple'"), bindparam('requete'))
+        correspond = tsvector.bool_op('@@')(tsquery)
+        score = func.ts_rank(tsvector, tsquery)
+        if prefix:
+            # Prefix match through the tsvector index, typo-tolerant match through the trigram index
+            correspond = correspond | document.bool_op('%')(bindparam('texte'))
+            score = score + func.similarity(document, bindparam('texte'))
+        score = score.label('score')
+        recents = select(table.c.id).where(correspond).order_by(table.c.id.desc()).limit(bindparam('candidats'))
+        detail = table.c[fields[1]] if len(fields) > 1 else literal_column('NULL')
+        query = select(table.c.id, table.c[fields[0]], detail, score).where(
+            table.c.id.in_(recents.scalar_subquery())
+        ).order_by(score.desc(), table.c.id).limit(bindparam('limit'))
+        return conn.execute(query, {
+            'requete': ' & '.join(termes) + (':*' if prefix else ''), 'texte': ' '.join(termes),
+            'candidats': candidats, 'limit': limit,
+        }).all()
+    
+    def search(self, texte, source='plats', limit=20, offset=0):
+        """Ranked type-ahead search over one SEARCH_FIELDS table, best match first.
+        
+        Rows where every word of texte is a whole word rank first; the last word is
+        then read as a prefix to fill the page (PostgreSQL also accepts close
+        spellings through pg_trgm). Each tier only ranks its newest
+        SEARCH_RANKED_ROWS matches (or limit + offset if larger), so a short prefix
+        costs the same on any table size. Older matches past that cap are not
+        ranked at all until a longer text narrows the matches.
+        """
+        if source not in SEARCH_FIELDS:
+            raise ValueError(f"Source de recherche inconnue: {source}")
+        termes = re.findall(r"\w+", texte.lower())
+        # A lone letter matches nearly every row; it only narrows anything when typed alone
+        termes = [terme for terme in termes if len(terme) > 1] or termes
+        if not termes:
+            return ()
+        voulus = limit + offset
+        with self.engine.connect() as conn:
+            rows = self._search_rows(conn, source, termes, False, voulus)
+            if len(rows) < voulus:
+                vus = {row[0] for row in rows}
+                rows += [
+                    row for row in self._search_rows(conn, source, termes, True, voulus + len(rows))
+                    if row[0] not in vus
+                ]
+        return tuple(ResultatRecherche(row[0], row[1], row[2], float(row[3])) for row in rows[offset:voulus])
+    
+    def cache_stats(self):
+        return self.cache.stats() if self.cache is not None else {}
+    
+    def pool_stats(self):
+        return self.pool_metrics.snapshot()
+    
+    def enable_profiling(self, slow_ms=100.0, explain_slow=False):
+        if self.profiler is None:
+            self.profiler = QueryProfiler(slow_ms, explain_slow)
+            self.profiler.attach(self.engine)
+        return self.profiler
+    
+    def disable_profiling(self):
+        if self.profiler is not None:
+            self.profiler.detach()
+        self.profiler = None
+    
+    def enable_analytics(self, max_lag=1.0, verify_every=60.0):
+        """Answer the aggregate reports from an in-process columnar snapshot instead of SQL."""
+        if self.analytics is None:
+            self.analytics = ColumnarSnapshot(self, max_lag, verify_every)
+            self.analytics.refresh()
+        return self.analytics
+    
+    def disable_analytics(self):
+        self.analytics = None
+    
+    def check_analytics(self, debut=None, fin=None):
+        """Compare every snapshot report with its SQL version and list every mismatch."""
+        snapshot = self.analytics or ColumnarSnapshot(self)
+        snapshot.refresh()
+        # Checked against the raw tables, not the summaries which may lag behind
+        queries = {**self.sample_queries(summaries=False), **self.period_queries()}
+        ecarts = []
+        with self.engine.connect() as conn:
+            for name in sorted(ANALYTICS_REPORTS):
+                params = self._periode(debut, fin) if name.endswith('_periode') else {}
+                # Whole rankings, so a difference below the top_plats cut-off still shows
+                attendu = list(conn.execute(queries[name].limit(None), params))
+                trouve = list(snapshot.report(name, sys.maxsize, **params))
+                for position in range(max(len(attendu), len(trouve))):
+                    a = attendu[position] if position < len(attendu) else None
+                    t = trouve[position] if position < len(trouve) else None
+                    if not _same_report_row(a, t):
+                        ecarts.append({'rapport': name, 'rang': position + 1, 'attendu': a, 'trouve': t})
+        
+        if ecarts:
+            logger.warning(f"{len(ecarts)} ecart(s) entre l'instantane analytique et SQL")
+        else:
+            logger.info("Instantane analytique coherent avec SQL")
+        return ecarts
+    
+    def execute_sample_queries(self):
+        try:
+            print("\nRESULTATS DES REQUETE")
+            print("=" * 50)
+            
+            print("\nTout les plats avec leur categorie:")
+            print("-" * 40)
+            for row in self.plats_par_categorie():
+                print(f"{row.plat:<20} | {row.prix:>6.2f} DH | {row.categorie}")
+            
+            print("\nCommande d'Amine Lahmidi:")
+            print("-" * 40)
+            for row in self.commandes_client('Amine Lahmidi'):
+                print(f"Commande #{row.commande_id} | {row.date_commande} | {row.total} DH")
+            
+            print("\nTop 5 des plat les plus commandé:")
+            print("-" * 40)
+            for i, row in enumerate(self.top_plats(5), 1):
+                print(f"{i}. {row.plat:<20} | {row.total_commande} fois commandé")
+            
+            print("\nChiffre d'affaire par categorie:")
+            print("-" * 40)
+            for row in self.ca_par_categorie():
+                print(f"{row.categorie:<15} | {row.ca:>8.2f} DH")
+            
+            print("\nClient les plus fidele:")
+            print("-" * 40)
+            for row in self.clients_fideles():
+                print(f"{row.client:<20} | {row.nb_commandes} commandes | {row.total_depense:.2f} DH")
+            
+            print("\nNote moyenne des plats (avec avis):")
+            print("-" * 40)
+            for row in self.notes_moyennes():
+                print(f"{row.plat:<20} | {row.note_moyenne:.1f}/5 | ({row.nb_avis} avis)")
+            
+        except Exception as e:
+            logger.error(f"Erreur pendant execution des requete: {e}")
+            raise
+
+
+def _async_url(connection_string):
+    url = make_url(connection_string)
+    backend = url.get_backend_name()
+    if backend == 'postgresql':
+        url = url.set(drivername='postgresql+asyncpg')
+    elif backend == 'sqlite':
+        url = url.set(drivername='sqlite+aiosqlite')
+    return url
+
+
+class AsyncRestaurantDatabase(RestaurantSchema):
+    """asyncio variant of RestaurantDatabase (asyncpg or aiosqlite) over the same tables and queries."""
+    
+    def __init__(self, connection_string, use_summaries=True, partitioned=False):
+        from sqlalchemy.ext.asyncio import create_async_engine
+        
+        self.use_summaries = use_summaries
+        url = _async_url(connection_string)
+        if partitioned and url.get_backend_name() != 'postgresql':
+            logger.warning(f"Partitionnement non supporté par {url.get_backend_name()}, tables simples utilisées")
+            partitioned = False
+        self.partitioned = partitioned
+        self._bind_schema()
+        connect_args = {}
+        if url.get_backend_name() == 'postgresql':
+            connect_args = {
+                "timeout": 10,
+                "server_settings": {"application_name": "restaurant_management_system"}
+            }
+        self.engine = create_async_engine(
+            url,
+            echo=False,
+            pool_pre_ping=True,
+            pool_recycle=300,
+            connect_args=connect_args
         )
     
-    def create_tables(self):
+    async def connect(self):
         try:
-            self.metadata.create_all(self.engine)
+            async with self.engine.connect() as conn:
+                await conn.execute(select(1))
+                logger.info("Connexion de base de donnée reussi!")
+        except Exception as e:
+            logger.error(f"Échec pour connecter a la database: {e}")
+            raise
+    
+    async def dispose(self):
+        await self.engine.dispose()
+    
+    async def create_tables(self):
+        try:
+            async with self.engine.begin() as conn:
+                await conn.run_sync(self.metadata.create_all)
             logger.info("Tables cree avec succes")
         except Exception as e:
             logger.error(f"Erreur pendant la creation des tables: {e}")
             raise
     
-    def drop_tables(self):
+    async def drop_tables(self):
         try:
-            self.metadata.drop_all(self.engine)
+            async with self.engine.begin() as conn:
+                await conn.run_sync(self.metadata.drop_all)
             logger.info("Tables supprimé")
         except Exception as e:
             logger.error(f"Erreur pendant suppression des tables: {e}")
             raise
     
-    def insert_sample_data(self):
-        with self.engine.connect() as conn:
-            try:
-                trans = conn.begin()
-                
-                categories_data = [
-                    {'id': 1, 'nom': 'Entrée'},
-                    {'id': 2, 'nom': 'Plat principal'},
-                    {'id': 3, 'nom': 'Dessert'},
-                    {'id': 4, 'nom': 'Boisson'},
-                    {'id': 5, 'nom': 'Végétarien'}
-                ]
-                conn.execute(insert(self.categories), categories_data)
-                
-                fournisseurs_data = [
-                    {'id': 1, 'nom': 'AgriFresh', 'contact': 'contact@agrifresh.com'},
-                    {'id': 2, 'nom': 'MeatSupplier', 'contact': 'info@meatsupplier.com'},
-                    {'id': 3, 'nom': 'BevCo', 'contact': 'sales@bevco.com'},
-                    {'id': 4, 'nom': 'DairyFarm', 'contact': 'dairy@farm.com'}
-                ]
-                conn.execute(insert(self.fournisseurs), fournisseurs_data)
-                
-                plats_data = [
-                    {'id': 1, 'nom': 'Salade César', 'prix': 45.00, 'description': 'Salade avec poulet grillé', 'categorie_id': 1},
-                    {'id': 2, 'nom': 'Soupe de légumes', 'prix': 30.00, 'description': 'Soupe chaude de saison', 'categorie_id': 1},
-                    {'id': 3, 'nom': 'Steak frites', 'prix': 90.00, 'description': 'Viande grillée et frites', 'categorie_id': 2},
-                    {'id': 4, 'nom': 'Pizza Margherita', 'prix': 70.00, 'description': 'Pizza tomate & mozzarella', 'categorie_id': 2},
-                    {'id': 5, 'nom': 'Tiramisu', 'prix': 35.00, 'description': 'Dessert italien', 'categorie_id': 3},
-                    {'id': 6, 'nom': 'Glace 2 boules', 'prix': 25.00, 'description': 'Glace au choix', 'categorie_id': 3},
-                    {'id': 7, 'nom': 'Coca-Cola', 'prix': 15.00, 'description': 'Boisson gazeuse', 'categorie_id': 4},
-                    {'id': 8, 'nom': 'Eau minérale', 'prix': 10.00, 'description': 'Eau plate ou gazeuse', 'categorie_id': 4},
-                    {'id': 9, 'nom': 'Curry de légumes', 'prix': 65.00, 'description': 'Plat végétarien épicé', 'categorie_id': 5},
-                    {'id': 10, 'nom': 'Falafel wrap', 'prix': 50.00, 'description': 'Wrap avec falafels et légumes', 'categorie_id': 5}
-                ]
-                conn.execute(insert(self.plats), plats_data)
-                
-                clients_data = [
-                    {'id': 1, 'nom': 'Amine Lahmidi', 'email': 'amine@example.com', 'telephone': '+212600123456'},
-                    {'id': 2, 'nom': 'Sara Benali', 'email': 'sara.b@example.com', 'telephone': '+212600654321'},
-                    {'id': 3, 'nom': 'Youssef El Khalfi', 'email': 'youssef.k@example.com', 'telephone': None},
-                    {'id': 4, 'nom': 'Fatima Zahra', 'email': 'fatima.z@example.com', 'telephone': '+212600987654'},
-                    {'id': 5, 'nom': 'Omar Alaoui', 'email': 'omar.a@example.com', 'telephone': '+212600112233'}
-                ]
-                conn.execute(insert(self.clients), clients_data)
-                
-                commandes_data = [
-                    {'id': 1, 'client_id': 1, 'date_commande': datetime(2025, 7, 7, 12, 30), 'total': 120.00},
-                    {'id': 2, 'client_id': 2, 'date_commande': datetime(2025, 7, 7, 13, 0), 'total': 85.00},
-                    {'id': 3, 'client_id': 1, 'date_commande': datetime(2025, 7, 8, 19, 45), 'total': 150.00},
-                    {'id': 4, 'client_id': 3, 'date_commande': datetime(2025, 8, 15, 18, 30), 'total': 200.00},
-                    {'id': 5, 'client_id': 4, 'date_commande': datetime(2025, 9, 1, 20, 0), 'total': 95.00},
-                    {'id': 6, 'client_id': 5, 'date_commande': datetime(2025, 9, 10, 12, 15), 'total': 75.00}
-                ]
-                conn.execute(insert(self.commandes), commandes_data)
-                
-                ingredients_data = [
-                    {'id': 1, 'nom': 'Poulet', 'cout_unitaire': 15.00, 'stock': 50, 'fournisseur_id': 2},
-                    {'id': 2, 'nom': 'Laitue', 'cout_unitaire': 5.00, 'stock': 20, 'fournisseur_id': 1},
-                    {'id': 3, 'nom': 'Tomate', 'cout_unitaire': 3.00, 'stock': 30, 'fournisseur_id': 1},
-                    {'id': 4, 'nom': 'Mozzarella', 'cout_unitaire': 10.00, 'stock': 15, 'fournisseur_id': 4},
-                    {'id': 5, 'nom': 'Pomme de terre', 'cout_unitaire': 2.00, 'stock': 100, 'fournisseur_id': 1},
-                    {'id': 6, 'nom': 'Café', 'cout_unitaire': 20.00, 'stock': 5, 'fournisseur_id': 3},
-                    {'id': 7, 'nom': 'Sucre', 'cout_unitaire': 1.50, 'stock': 25, 'fournisseur_id': 3},
-                    {'id': 8, 'nom': 'Pois chiches', 'cout_unitaire': 4.00, 'stock': 40, 'fournisseur_id': 1}
-                ]
-                conn.execute(insert(self.ingredients), ingredients_data)
-                
-                commande_plats_data = [
-                    {'commande_id': 1, 'plat_id': 1, 'quantite': 1},
-                    {'commande_id': 1, 'plat_id': 3, 'quantite': 1},
-                    {'commande_id': 1, 'plat_id': 7, 'quantite': 2},
-                    {'commande_id': 2, 'plat_id': 2, 'quantite': 1},
-                    {'commande_id': 2, 'plat_id': 4, 'quantite': 1},
-                    {'commande_id': 2, 'plat_id': 8, 'quantite': 1},
-                    {'commande_id': 3, 'plat_id': 3, 'quantite': 1},
-                    {'commande_id': 3, 'plat_id': 5, 'quantite': 1},
-                    {'commande_id': 3, 'plat_id': 7, 'quantite': 1},
-                    {'commande_id': 4, 'plat_id': 4, 'quantite': 2},
-                    {'commande_id': 4, 'plat_id': 9, 'quantite': 1},
-                    {'commande_id': 5, 'plat_id': 10, 'quantite': 1},
-                    {'commande_id': 5, 'plat_id': 8, 'quantite': 2},
-                    {'commande_id': 6, 'plat_id': 7, 'quantite': 3},
-                    {'commande_id': 6, 'plat_id': 6, 'quantite': 1}
-                ]
-                conn.execute(insert(self.commande_plats), commande_plats_data)
-                
-                plat_ingredients_data = [
-                    {'plat_id': 1, 'ingredient_id': 1, 'quantite_necessaire': 0.2},
-                    {'plat_id': 1, 'ingredient_id': 2, 'quantite_necessaire': 0.1},
-                    {'plat_id': 2, 'ingredient_id': 2, 'quantite_necessaire': 0.05},
-                    {'plat_id': 2, 'ingredient_id': 5, 'quantite_necessaire': 0.1},
-                    {'plat_id': 3, 'ingredient_id': 1, 'quantite_necessaire': 0.3},
-                    {'plat_id': 3, 'ingredient_id': 5, 'quantite_necessaire': 0.2},
-                    {'plat_id': 4, 'ingredient_id': 3, 'quantite_necessaire': 0.1},
-                    {'plat_id': 4, 'ingredient_id': 4, 'quantite_necessaire': 0.15},
-                    {'plat_id': 5, 'ingredient_id': 6, 'quantite_necessaire': 0.05},
-                    {'plat_id': 5, 'ingredient_id': 7, 'quantite_necessaire': 0.02},
-                    {'plat_id': 9, 'ingredient_id': 8, 'quantite_necessaire': 0.1},
-                    {'plat_id': 10, 'ingredient_id': 8, 'quantite_necessaire': 0.15}
-                ]
-                conn.execute(insert(self.plat_ingredients), plat_ingredients_data)
-                
-                avis_data = [
-                    {'id': 1, 'client_id': 1, 'plat_id': 1, 'note': 4, 'commentaire': 'Très frais, poulet bien cuit', 'date_avis': datetime(2025, 7, 7, 13, 0)},
-                    {'id': 2, 'client_id': 2, 'plat_id': 4, 'note': 5, 'commentaire': 'Meilleure pizza du coin !', 'date_avis': datetime(2025, 7, 7, 14, 0)},
-                    {'id': 3, 'client_id': 3, 'plat_id': 9, 'note': 3, 'commentaire': 'Un peu trop épicé', 'date_avis': datetime(2025, 8, 15, 19, 0)},
-                    {'id': 4, 'client_id': 4, 'plat_id': 10, 'note': 4, 'commentaire': 'Bon, mais manque de sauce', 'date_avis': datetime(2025, 9, 1, 21, 0)},
-                    {'id': 5, 'client_id': 5, 'plat_id': 6, 'note': 5, 'commentaire': 'Glace délicieuse', 'date_avis': datetime(2025, 9, 10, 13, 0)}
-                ]
-                conn.execute(insert(self.avis), avis_data)
-                
-                trans.commit()
-                logger.info("Donnée d'exemple inseré avec succes")
-                
-            except Exception as e:
-                trans.rollback()
-                logger.error(f"Erreur pendant insertion des donnée: {e}")
-                raise
+    async def insert_sample_data(self):
+        data = self.sample_data()
+        try:
+            async with self.engine.begin() as conn:
+                await conn.run_sync(self._sync_sample_data, data)
+            logger.info("Donnée d'exemple inseré avec succes")
+        except Exception as e:
+            logger.error(f"Erreur pendant insertion des donnée: {e}")
+            raise
     
-    def execute_sample_queries(self):
-        with self.engine.connect() as conn:
+    def _sync_sample_data(self, conn, data):
+        summaries = {'rebuild': False, 'updated': False}
+        for table_name in TABLE_LOAD_ORDER:
+            self._sync_table(conn, self.metadata.tables[table_name], data[table_name], summaries=summaries)
+        if summaries['rebuild']:
+            self._rebuild_summaries(conn)
+    
+    async def insert_rows(self, table_name, rows):
+        """Insert a batch of rows in one transaction, keeping the summary tables in step."""
+        rows = list(rows)
+        async with self.engine.begin() as conn:
+            await conn.execute(insert(self.metadata.tables[table_name]), rows)
+            if table_name in ('commandes', 'commande_plats', 'avis'):
+                await conn.run_sync(self._update_summaries, **{table_name: rows})
+        return len(rows)
+    
+    async def _report(self, name, limit=None, **params):
+        row_type = REPORT_ROW_TYPES[name]
+        # One connection per report so gather() really runs them side by side
+        async with self.engine.connect() as conn:
+            result = await conn.execute(self._report_query(name, limit), params)
+            return tuple(row_type(*row) for row in result)
+    
+    async def plats_par_categorie(self):
+        return await self._report('plats_par_categorie')
+    
+    async def commandes_client(self, nom):
+        return await self._report('commandes_client', client_nom=nom)
+    
+    async def top_plats(self, limit=5, debut=None, fin=None):
+        if debut is None and fin is None:
+            return await self._report('top_plats', limit=limit)
+        return await self._report('top_plats_periode', limit=limit, **self._periode(debut, fin))
+    
+    async def ca_par_categorie(self, debut=None, fin=None):
+        if debut is None and fin is None:
+            return await self._report('ca_par_categorie')
+        return await self._report('ca_par_categorie_periode', **self._periode(debut, fin))
+    
+    async def clients_fideles(self, debut=None, fin=None):
+        if debut is None and fin is None:
+            return await self._report('clients_fideles')
+        return await self._report('clients_fideles_periode', **self._periode(debut, fin))
+    
+    async def notes_moyennes(self, debut=None, fin=None):
+        if debut is None and fin is None:
+            return await self._report('notes_moyennes')
+        return await self._report('notes_moyennes_periode', **self._periode(debut, fin))
+    
+    def _dashboard_calls(self, client_nom):
+        return {
+            'plats_par_categorie': self.plats_par_categorie,
+            'commandes_client': lambda: self.commandes_client(client_nom),
+            'top_plats': self.top_plats,
+            'ca_par_categorie': self.ca_par_categorie,
+            'clients_fideles': self.clients_fideles,
+            'notes_moyennes': self.notes_moyennes,
+        }
+    
+    async def all_reports(self, client_nom='Amine Lahmidi', concurrent=True):
+        """Run the six reports, concurrently with asyncio.gather unless concurrent=False."""
+        calls = self._dashboard_calls(client_nom)
+        if concurrent:
+            results = await asyncio.gather(*(call() for call in calls.values()))
+        else:
+            results = [await call() for call in calls.values()]
+        return dict(zip(calls, results))
+
+DSN_CACHE_FILE = os.getenv(
+    'DB_DSN_CACHE',
+    os.path.join(os.path.expanduser('~'), '.restaurant_db_dsn')
+)
+
+
+def _mask_dsn(config):
+    if '@' not in config:
+        return config
+    return f"{config.split('@')[0]}@{config.split('@')[1].split('/')[0]}/..."
+
+
+def _probe_connection(config, probe_timeout):
+    connect_args = {}
+    if config.startswith('postgresql'):
+        # libpq only accepts whole seconds and ignores values below 2
+        connect_args['connect_timeout'] = max(2, int(probe_timeout))
+    test_engine = create_engine(config, poolclass=NullPool, connect_args=connect_args)
+    try:
+        with test_engine.connect() as conn:
+            conn.execute(select(1))
+        return config
+    finally:
+        test_engine.dispose()
+
+
+def _read_cached_dsn(cache_file):
+    try:
+        with open(cache_file, encoding='utf-8') as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def _write_cached_dsn(cache_file, config):
+    try:
+        # Created owner-only: the DSN carries the password, so it must never be readable by others
+        fd = os.open(cache_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        if hasattr(os, 'fchmod'):
+            # O_CREAT's mode does not apply to a file that already exists
+            os.fchmod(fd, 0o600)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(config)
+    except OSError as e:
+        logger.debug(f"Impossible d'ecrire le cache DSN {cache_file}: {e}")
+
+
+def _forget_cached_dsn(cache_file):
+    try:
+        os.remove(cache_file)
+    except OSError:
+        pass
+
+
+def _probe_parallel(configs, probe_timeout, total_timeout):
+    """Race every candidate and return the first DSN that answers."""
+    executor = ThreadPoolExecutor(max_workers=len(configs), thread_name_prefix='dsn-probe')
+    futures = {executor.submit(_probe_connection, config, probe_timeout): config for config in configs}
+    winner = None
+    try:
+        for future in as_completed(futures, timeout=total_timeout):
+            config = futures[future]
             try:
-                print("\nRESULTATS DES REQUETE")
-                print("=" * 50)
-                
-                print("\nTout les plats avec leur categorie:")
-                print("-" * 40)
-                query = select(
-                    self.plats.c.nom.label('plat'),
-                    self.plats.c.prix,
-                    self.categories.c.nom.label('categorie')
-                ).select_from(
-                    self.plats.join(self.categories)
-                ).order_by(self.categories.c.nom, self.plats.c.prix)
-                
-                result = conn.execute(query)
-                for row in result:
-                    print(f"{row.plat:<20} | {row.prix:>6.2f} DH | {row.categorie}")
-                
-                print("\nCommande d'Amine Lahmidi:")
-                print("-" * 40)
-                query = select(
-                    self.commandes.c.id.label('commande_id'),
-                    self.commandes.c.date_commande,
-                    self.commandes.c.total
-                ).select_from(
-                    self.commandes.join(self.clients)
-                ).where(
-                    self.clients.c.nom == 'Amine Lahmidi'
-                ).order_by(self.commandes.c.date_commande)
-                
-                result = conn.execute(query)
-                for row in result:
-                    print(f"Commande #{row.commande_id} | {row.date_commande} | {row.total} DH")
-                
-                print("\nTop 5 des plat les plus commandé:")
-                print("-" * 40)
-                query = select(
-                    self.plats.c.nom.label('plat'),
-                    func.sum(self.commande_plats.c.quantite).label('total_commande')
-                ).select_from(
-                    self.plats.join(self.commande_plats)
-                ).group_by(
-                    self.plats.c.id, self.plats.c.nom
-                ).order_by(
-                    func.sum(self.commande_plats.c.quantite).desc()
-                ).limit(5)
-                
-                result = conn.execute(query)
-                for i, row in enumerate(result, 1):
-                    print(f"{i}. {row.plat:<20} | {row.total_commande} fois commandé")
-                
-                print("\nChiffre d'affaire par categorie:")
-                print("-" * 40)
-                query = select(
-                    self.categories.c.nom.label('categorie'),
-                    func.sum(self.plats.c.prix * self.commande_plats.c.quantite).label('ca')
-                ).select_from(
-                    self.categories
-                    .join(self.plats)
-                    .join(self.commande_plats)
-                ).group_by(
-                    self.categories.c.id, self.categories.c.nom
-                ).order_by(
-                    func.sum(self.plats.c.prix * self.commande_plats.c.quantite).desc()
-                )
-                
-                result = conn.execute(query)
-                for row in result:
-                    print(f"{row.categorie:<15} | {row.ca:>8.2f} DH")
-                
-                print("\nClient les plus fidele:")
-                print("-" * 40)
-                query = select(
-                    self.clients.c.nom.label('client'),
-                    func.count(self.commandes.c.id).label('nb_commandes'),
-                    func.sum(self.commandes.c.total).label('total_depense')
-                ).select_from(
-                    self.clients.join(self.commandes)
-                ).group_by(
-                    self.clients.c.id, self.clients.c.nom
-                ).order_by(
-                    func.count(self.commandes.c.id).desc()
-                )
-                
-                result = conn.execute(query)
-                for row in result:
-                    print(f"{row.client:<20} | {row.nb_commandes} commandes | {row.total_depense:.2f} DH")
-                
-                print("\nNote moyenne des plats (avec avis):")
-                print("-" * 40)
-                query = select(
-                    self.plats.c.nom.label('plat'),
-                    func.avg(self.avis.c.note).label('note_moyenne'),
-                    func.count(self.avis.c.id).label('nb_avis')
-                ).select_from(
-                    self.plats.join(self.avis)
-                ).group_by(
-                    self.plats.c.id, self.plats.c.nom
-                ).order_by(
-                    func.avg(self.avis.c.note).desc()
-                )
-                
-                result = conn.execute(query)
-                for row in result:
-                    print(f"{row.plat:<20} | {row.note_moyenne:.1f}/5 | ({row.nb_avis} avis)")
-                
+                winner = future.result()
+                break
             except Exception as e:
-                logger.error(f"Erreur pendant execution des requete: {e}")
-                raise
+                logger.debug(f"Echec avec {config.split('@')[1].split('/')[0]}: {e}")
+    except FuturesTimeout:
+        logger.warning(f"Aucune connexion trouvé en {total_timeout}s")
+    finally:
+        # Probes still blocked in connect() dispose of their own engine when they return
+        executor.shutdown(wait=False, cancel_futures=True)
+    return winner
+
 
+def _probe_serial(configs, probe_timeout):
+    for config in configs:
+        try:
+            return _probe_connection(config, probe_timeout)
+        except Exception as e:
+            logger.debug(f"Echec avec {config.split('@')[1].split('/')[0]}: {e}")
+    return None
 
-def get_connection_string():
+
+def get_connection_string(parallel=True, probe_timeout=3, total_timeout=10, cache_file=DSN_CACHE_FILE,
+                          verify_cache=True):
     """Try different connection configurations"""
     
     if all(os.getenv(var) for var in ['DB_HOST', 'DB_USER', 'DB_PASSWORD', 'DB_NAME']):
@@ -368,48 +3553,122 @@ def get_connection_string():
     
     all_configs = local_configs + docker_configs
     
-    for config in all_configs:
-        try:
-            test_engine = create_engine(config, pool_pre_ping=True)
-            with test_engine.connect() as conn:
-                conn.execute(select(1))
-                logger.info(f"Connexion reussi avec: {config.split('@')[0]}@{config.split('@')[1].split('/')[0]}/...")
-                return config
-        except Exception as e:
-            logger.debug(f"Echec avec {config.split('@')[1].split('/')[0]}: {e}")
-            continue
+    if cache_file:
+        cached = _read_cached_dsn(cache_file)
+        if cached and not verify_cache:
+            # The caller validates it with its first real connection instead of a probe
+            return cached
+        if cached:
+            try:
+                _probe_connection(cached, probe_timeout)
+                logger.info(f"Connexion reussi avec (cache): {_mask_dsn(cached)}")
+                return cached
+            except Exception as e:
+                logger.info(f"DSN en cache invalide, nouvelle recherche: {e}")
+                _forget_cached_dsn(cache_file)
     
-    return None
+    if parallel:
+        config = _probe_parallel(all_configs, probe_timeout, total_timeout)
+    else:
+        config = _probe_serial(all_configs, probe_timeout)
+    
+    if config is None:
+        return None
+    
+    logger.info(f"Connexion reussi avec: {_mask_dsn(config)}")
+    if cache_file:
+        _write_cached_dsn(cache_file, config)
+    return config
 
 
-def create_database_if_not_exists(connection_string):
+def create_database_if_not_exists(connection_string, engine=None):
+    """Create the target PostgreSQL database if needed; True when it is reachable afterwards."""
+    url = make_url(connection_string)
+    if url.get_backend_name() != 'postgresql':
+        return True
+    
+    if engine is not None:
+        # Reuse the application engine: when it connects the database exists and no admin engine is needed
+        try:
+            with engine.connect() as conn:
+                conn.execute(select(1))
+            return True
+        except exc.OperationalError as e:
+            logger.info(f"Base de donnée injoignable, verification via 'postgres': {e}")
+    
+    admin_engine = None
     try:
-        base_conn_string = connection_string.rsplit('/', 1)[0] + '/postgres'
-        engine = create_engine(base_conn_string)
-        
-        with engine.connect() as conn:
-            conn.execute("COMMIT")
-            
-            db_name = connection_string.rsplit('/', 1)[1]
-            result = conn.execute(f"SELECT 1 FROM pg_database WHERE datname = '{db_name}'")
+        admin_engine = create_engine(
+            url.set(database='postgres'),
+            poolclass=NullPool,
+            isolation_level='AUTOCOMMIT',
+            connect_args=_connect_args(connection_string)
+        )
+        with admin_engine.connect() as conn:
+            db_name = url.database
+            result = conn.execute(text("SELECT 1 FROM pg_database WHERE datname = :name"), {'name': db_name})
             
             if not result.fetchone():
-                conn.execute(f"CREATE DATABASE {db_name}")
+                preparer = admin_engine.dialect.identifier_preparer
+                conn.execute(text(f"CREATE DATABASE {preparer.quote(db_name)}"))
                 logger.info(f"Base de donnée '{db_name}' cree")
             else:
                 logger.info(f"Base de donnée '{db_name}' existe deja")
+        return True
                 
     except Exception as e:
         logger.warning(f"Impossible de creer la base de donnée: {e}")
+        return False
+    finally:
+        if admin_engine is not None:
+            admin_engine.dispose()
+
+
+def bootstrap(cache_file=DSN_CACHE_FILE, **db_kwargs):
+    """Resolve the DSN, ensure the database exists and return a lazy RestaurantDatabase (None if unreachable).
+    
+    A cached DSN is trusted without probing; the shared engine's first connection
+    validates it and the configurations are only probed again when that fails.
+    """
+    connection_string = get_connection_string(cache_file=cache_file, verify_cache=False)
+    if connection_string is None:
+        return None
+    
+    db = RestaurantDatabase(connection_string, lazy=True, **db_kwargs)
+    if create_database_if_not_exists(connection_string, engine=db.engine):
+        return db
+    
+    db.dispose()
+    if not cache_file or _read_cached_dsn(cache_file) != connection_string:
+        return None
+    logger.info(f"DSN en cache invalide, nouvelle recherche: {_mask_dsn(connection_string)}")
+    _forget_cached_dsn(cache_file)
+    connection_string = get_connection_string(cache_file=cache_file)
+    if connection_string is None:
+        return None
+    return RestaurantDatabase(connection_string, lazy=True, **db_kwargs)
 
 
-def main():
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Systeme de gestion de restaurant")
+    parser.add_argument('--profile', action='store_true', help="Mesurer la latence de chaque requete SQL")
+    parser.add_argument('--slow-ms', type=float, default=100.0, help="Seuil du journal des requetes lentes")
+    parser.add_argument('--explain-slow', action='store_true', help="Joindre le plan EXPLAIN aux requetes lentes")
+    parser.add_argument('--profile-out', help="Fichier JSON pour les statistiques de requetes")
+    parser.add_argument('--analytics', action='store_true',
+                        help="Calculer les rapports agreges en memoire (NumPy) au lieu de SQL")
+    parser.add_argument('--refresh-summaries', action='store_true',
+                        help="Reconstruire les tables de synthese depuis les tables brutes")
+    parser.add_argument('--check-summaries', action='store_true',
+                        help="Comparer les tables de synthese aux tables brutes et lister les ecarts")
+    args = parser.parse_args(argv)
+    
     print("SYSTEME DE GESTION DE RESTAURANT")
     print("=" * 50)
     
-    connection_string = get_connection_string()
+    db = bootstrap()
     
-    if not connection_string:
+    if db is None:
         print("\n❌ ERREUR: Impossible de se connecté a PostgreSQL")
         print("\nVerification a effectuer:")
         print("1. PostgreSQL est-il installé et demarré ?")
@@ -428,12 +3687,11 @@ def main():
         print("export DB_PORT=5432")
         return sys.exit(1)
     
-    print(f"Connexion trouvé: {connection_string.split('@')[0]}@{connection_string.split('@')[1].split('/')[0]}/...")
+    print(f"Connexion trouvé: {_mask_dsn(db.connection_string)}")
     
     try:
-        create_database_if_not_exists(connection_string)
-        
-        db = RestaurantDatabase(connection_string)
+        if args.profile or args.profile_out:
+            db.enable_profiling(args.slow_ms, args.explain_slow)
         
         print("\nCreation des tables...")
         db.create_tables()
@@ -441,9 +3699,32 @@ def main():
         print("\nInsertion des données d'exemple...")
         db.insert_sample_data()
         
+        if args.refresh_summaries:
+            print("\nReconstruction des tables de synthese...")
+            db.refresh_summaries()
+        
+        if args.check_summaries:
+            print("\nVerification des tables de synthese...")
+            ecarts = db.check_summaries()
+            for ecart in ecarts:
+                print(f"{ecart['table']} {ecart['cle']}: attendu {ecart['attendu']}, trouvé {ecart['trouve']}")
+            if not ecarts:
+                print("Tables de synthese coherentes")
+        
+        if args.analytics:
+            db.enable_analytics()
+        
         print("\nExécution des requêtes d'exemple...")
         db.execute_sample_queries()
         
+        if db.profiler is not None:
+            print("\nSTATISTIQUES DES REQUETES")
+            print("=" * 50)
+            print(db.profiler.format_summary())
+            if args.profile_out:
+                db.profiler.dump(args.profile_out)
+                print(f"\nStatistiques ecrites dans {args.profile_out}")
+        
         print("\n" + "=" * 50)
         print("✅ PROGRAMME TERMINE AVEC SUCCES")
         print("=" * 50)
@@ -457,6 +3738,8 @@ def main():
         print("3. Vérifier que la base de données existe")
         print("4. Vérifier les permissions utilisateur")
         return sys.exit(1)
+    finally:
+        db.dispose()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,81 @@
+import threading
+
+import pytest
+from sqlalchemy import select
+
+from SQL_Python_sol import RestaurantDatabase
+
+
+@pytest.fixture
+def db(tmp_path):
+    db = RestaurantDatabase(f"sqlite:///{tmp_path / 'restaurant.db'}")
+    db.create_tables()
+    yield db
+    db.dispose()
+
+
+CLIENTS = [
+    {'id': 1, 'nom': 'Amine Lahmidi', 'email': 'amine@example.com', 'telephone': '+212600123456'},
+    {'id': 2, 'nom': 'Sara Benali', 'email': 'sara.b@example.com', 'telephone': None},
+]
+
+
+def test_sync_natural_key_second_run_writes_nothing(db):
+    # Sara is already stored under another id than the feed's
+    db.sync('clients', [dict(CLIENTS[1], id=5)])
+    assert db.sync('clients', CLIENTS) == {'inserted': 1, 'updated': 0, 'unchanged': 1}
+    assert db.sync('clients', CLIENTS) == {'inserted': 0, 'updated': 0, 'unchanged': 2}
+
+
+def test_sync_natural_key_ignores_feed_ids(db):
+    db.sync('clients', CLIENTS)
+    # Another system numbers its clients differently: ids collide with stored rows
+    feed = [
+        {'id': 2, 'nom': 'Amine Lahmidi', 'email': 'amine@example.com', 'telephone': '+212600123456'},
+        {'id': 1, 'nom': 'Omar Alaoui', 'email': 'omar.a@example.com', 'telephone': None},
+    ]
+    assert db.sync('clients', feed) == {'inserted': 1, 'updated': 0, 'unchanged': 1}
+    with db.engine.connect() as conn:
+        rows = {row.email: row.id for row in conn.execute(select(db.clients))}
+    assert rows['amine@example.com'] == 1
+    assert rows['sara.b@example.com'] == 2
+    assert rows['omar.a@example.com'] not in (1, 2)
+
+
+@pytest.fixture
+def dead_db(tmp_path):
+    # The directory does not exist, so every connection attempt fails
+    db = RestaurantDatabase(f"sqlite:///{tmp_path / 'absent' / 'restaurant.db'}", lazy=True)
+    yield db
+    db.dispose()
+
+
+def _returns(call, timeout=10):
+    # Daemon thread, so a call that never returns fails the test instead of hanging the run
+    result = []
+    thread = threading.Thread(target=lambda: result.append(call()), daemon=True)
+    thread.start()
+    thread.join(timeout)
+    assert not thread.is_alive(), f"{call.__name__}() bloque"
+    return result[0]
+
+
+def test_write_behind_without_spill_gives_up_on_dead_engine(dead_db):
+    file = dead_db.write_behind(retry_delay=60)
+    file.submit_avis(1, 1, 5)
+    file.submit_order(1, {1: 2})
+    assert _returns(file.flush) is False
+    assert file.stats()['pending'] == 2
+    assert _returns(file.close) == 2
+
+
+def test_write_behind_spills_on_dead_engine(dead_db, tmp_path):
+    spill = tmp_path / 'file.jsonl'
+    file = dead_db.write_behind(retry_delay=60, spill_path=str(spill))
+    file.submit_avis(1, 1, 5)
+    file.submit_order(1, {1: 2})
+    assert _returns(file.flush) is False
+    assert file.stats()['backlog'] == 2
+    assert _returns(file.close) == 2
+    # Kept for the next run, which picks them up from the spill or its .replay file
+    assert dead_db.write_behind(spill_path=str(spill)).close() == 2